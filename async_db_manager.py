@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+import aiomysql
+from aiomysql import Error
+from config import ASYNC_MYSQL_POOL_MIN_SIZE, ASYNC_MYSQL_POOL_MAX_SIZE, SQL_FETCH_BATCH_SIZE
+from metrics import QUERY_LATENCY, QUERY_ERRORS, CONNECT_LATENCY, ROWS_FETCHED, RESULT_BYTES, estimate_row_bytes
+
+
+class AsyncDatabaseManager:
+    """
+    Bản asyncio của DatabaseManager trên pool aiomysql. Mỗi lệnh mượn một
+    kết nối (autocommit) từ pool, nên nhiều coroutine có thể truy vấn đồng
+    thời; dùng transaction() khi cần nhiều lệnh trong một transaction.
+    """
+
+    def __init__(self, host: str, port: int, initial_db: str | None = None,
+                 minsize: int = ASYNC_MYSQL_POOL_MIN_SIZE, maxsize: int = ASYNC_MYSQL_POOL_MAX_SIZE):
+        self.host = host
+        self.port = port
+        self.initial_db = initial_db
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.pool = None
+        self.dynamic_user = None
+        self.lease_id = None
+        self._retiring = set()
+
+    async def _create_pool(self, username: str, password: str):
+        start_time = time.perf_counter()
+        try:
+            pool = await aiomysql.create_pool(
+                host=self.host,
+                port=self.port,
+                user=username,
+                password=password,
+                db=self.initial_db,
+                minsize=self.minsize,
+                maxsize=self.maxsize,
+                autocommit=True,
+            )
+            CONNECT_LATENCY.observe(time.perf_counter() - start_time)
+            return pool
+        except Error as e:
+            logging.error(f"loi khi ket noi: {e}")
+            return None
+        except Exception as e:
+            logging.error(f"loi khong mong doi khi ket noi: {e}")
+            return None
+
+    async def connect(self, username: str, password: str, lease_id: str | None = None) -> bool:
+        logging.info(f"dang ket noi den mysql ({self.host}:{self.port}) bang user: {username} (async)...")
+        pool = await self._create_pool(username, password)
+        if pool is None:
+            return False
+        self.pool = pool
+        self.dynamic_user = username
+        self.lease_id = lease_id
+        logging.info("-> ket noi thanh cong")
+        return True
+
+    async def swap_credentials(self, username: str, password: str, lease_id: str | None = None) -> bool:
+        """
+        Tạo pool mới bằng credentials mới rồi chuyển sang ngay; pool cũ đóng
+        dần ở nền khi các truy vấn đang mượn kết nối của nó trả kết nối về.
+        """
+        pool = await self._create_pool(username, password)
+        if pool is None:
+            return False
+        old_pool, old_user = self.pool, self.dynamic_user
+        self.pool = pool
+        self.dynamic_user = username
+        self.lease_id = lease_id
+        if old_pool is not None:
+            task = asyncio.get_running_loop().create_task(self._retire_pool(old_pool, old_user))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+        logging.info(f"Da chuyen sang credentials moi (user: {username}).")
+        return True
+
+    @staticmethod
+    async def _retire_pool(pool, username: str):
+        pool.close()
+        await pool.wait_closed()
+        logging.info(f"Da dong pool cua user cu: {username}.")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Mượn một kết nối từ pool hiện tại trong khối `async with`."""
+        if self.pool is None:
+            raise ConnectionError("Chua ket noi database (async).")
+        pool = self.pool
+        connection = await pool.acquire()
+        try:
+            yield connection
+        finally:
+            pool.release(connection)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Khối `async with` chạy trong một transaction, commit khi thoát bình thường, rollback khi có lỗi."""
+        async with self.acquire() as connection:
+            await connection.begin()
+            try:
+                async with connection.cursor() as cursor:
+                    yield cursor
+            except BaseException:
+                await connection.rollback()
+                raise
+            await connection.commit()
+
+    async def fetch_all(self, sql_command: str, params=None) -> tuple | None:
+        """Thực thi câu đọc, trả về (columns, rows) hoặc None khi lỗi."""
+        try:
+            async with self.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    start_time = time.perf_counter()
+                    await cursor.execute(sql_command, params)
+                    QUERY_LATENCY.observe(time.perf_counter() - start_time, method="async_fetch_all")
+                    columns = [col[0] for col in cursor.description or ()]
+                    rows = await cursor.fetchall()
+        except (Error, ConnectionError) as e:
+            QUERY_ERRORS.inc(method="async_fetch_all")
+            logging.error(f"loi khi thuc thi SQL: '{sql_command[:100]}...': {e}")
+            return None
+        if rows:
+            ROWS_FETCHED.inc(len(rows))
+            RESULT_BYTES.inc(estimate_row_bytes(rows[0]) * len(rows))
+        return columns, list(rows)
+
+    async def execute(self, sql_command: str, params=None) -> int | None:
+        """Thực thi lệnh ghi (autocommit), trả về số dòng bị ảnh hưởng hoặc None khi lỗi."""
+        try:
+            async with self.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    start_time = time.perf_counter()
+                    await cursor.execute(sql_command, params)
+                    QUERY_LATENCY.observe(time.perf_counter() - start_time, method="async_execute")
+                    return cursor.rowcount
+        except (Error, ConnectionError) as e:
+            QUERY_ERRORS.inc(method="async_execute")
+            logging.error(f"loi khi thuc thi SQL: '{sql_command[:100]}...': {e}")
+            return None
+
+    async def stream(self, sql_command: str, params=None, batch_size: int = SQL_FETCH_BATCH_SIZE, max_rows: int = 0):
+        """
+        Async generator trả (columns, rows) theo từng lô bằng SSCursor không
+        buffer, tương tự iter_batches. Kết nối bị giữ tới khi đọc xong hoặc
+        generator bị đóng.
+        """
+        async with self.acquire() as connection:
+            async with connection.cursor(aiomysql.SSCursor) as cursor:
+                start_time = time.perf_counter()
+                try:
+                    await cursor.execute(sql_command, params)
+                except Error:
+                    QUERY_ERRORS.inc(method="async_stream")
+                    raise
+                QUERY_LATENCY.observe(time.perf_counter() - start_time, method="async_stream")
+                columns = [col[0] for col in cursor.description or ()]
+                fetched = 0
+                while True:
+                    size = batch_size
+                    if max_rows:
+                        size = min(batch_size, max_rows - fetched)
+                        if size <= 0:
+                            break
+                    rows = await cursor.fetchmany(size)
+                    if not rows:
+                        break
+                    fetched += len(rows)
+                    ROWS_FETCHED.inc(len(rows))
+                    RESULT_BYTES.inc(estimate_row_bytes(rows[0]) * len(rows))
+                    yield columns, rows
+
+    async def close(self):
+        if self._retiring:
+            await asyncio.gather(*self._retiring, return_exceptions=True)
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            logging.info(f"dong pool ket noi user: {self.dynamic_user}.")
+            self.pool = None
+            self.dynamic_user = None
+            self.lease_id = None
+
+    def is_connected(self) -> bool:
+        return self.pool is not None
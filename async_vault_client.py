@@ -0,0 +1,268 @@
+import asyncio
+import inspect
+import itertools
+import logging
+import time
+import aiohttp
+from config import (
+    DEFAULT_LEASE_DURATION_WARNING_SECONDS, LEASE_RENEW_THRESHOLD_RATIO,
+    LEASE_RENEW_INCREMENT_SECONDS, LEASE_RETRY_INTERVAL_SECONDS, ASYNC_VAULT_MAX_CONNECTIONS
+)
+from metrics import VAULT_LATENCY, VAULT_ERRORS, LEASE_REMAINING
+
+# So thu tu cua lease renewal, dung lam nhan metrics nhu LeaseHandle.number
+_renewal_numbers = itertools.count(1)
+
+
+class AsyncVaultClient:
+    """
+    Bản asyncio của VaultClient: gọi thẳng HTTP API của Vault qua một
+    aiohttp.ClientSession dùng chung (keep-alive, tối đa `max_connections`
+    kết nối), nên hàng nghìn lease có thể được lấy/gia hạn đồng thời.
+    """
+
+    def __init__(self, vault_addr: str, vault_token: str, max_connections: int = ASYNC_VAULT_MAX_CONNECTIONS):
+        self.vault_addr = vault_addr.rstrip("/")
+        self.vault_token = vault_token
+        self.max_connections = max_connections
+        self.session = None
+        self._authenticated = False
+
+    async def connect(self) -> bool:
+        if not self.vault_token:
+            logging.error("Thieu VAULT_TOKEN.")
+            return False
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                headers={"X-Vault-Token": self.vault_token},
+                raise_for_status=False,
+            )
+        response = await self._request("GET", "auth/token/lookup-self", "lookup_self")
+        self._authenticated = response is not None
+        if self._authenticated:
+            logging.info("Ket noi va xac thuc Vault (async) thanh cong.")
+        else:
+            logging.error("Ket noi Vault (async) KHONG xac thuc duoc. Kiem tra lai token.")
+        return self._authenticated
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self._authenticated = False
+
+    async def __aenter__(self) -> "AsyncVaultClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def is_authenticated(self) -> bool:
+        return self.session is not None and self._authenticated
+
+    async def _request(self, method: str, path: str, operation: str, payload: dict | None = None) -> dict | None:
+        """Gọi /v1/<path>; trả về JSON (dict rỗng với 204) hoặc None khi lỗi."""
+        start_time = time.perf_counter()
+        try:
+            async with self.session.request(method, f"{self.vault_addr}/v1/{path}", json=payload) as response:
+                if response.status == 204:
+                    body = {}
+                else:
+                    body = await response.json(content_type=None) or {}
+                VAULT_LATENCY.observe(time.perf_counter() - start_time, operation=operation)
+                if response.status >= 400:
+                    VAULT_ERRORS.inc(operation=operation)
+                    logging.warning(f"Vault tra ve {response.status} cho {operation}: {body.get('errors')}")
+                    return None
+                return body
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            VAULT_ERRORS.inc(operation=operation)
+            logging.error(f"Loi khi goi Vault ({operation}) tai {self.vault_addr}: {e}")
+            return None
+
+    async def get_db_credentials(self, role_name: str) -> dict | None:
+        if not self.is_authenticated():
+            logging.error("Client chưa được xác thực, không thể lấy credentials.")
+            return None
+
+        logging.info(f"Dang yeu cau credentials cho role: {role_name}")
+        read_response = await self._request("GET", f"database/creds/{role_name}", "get_db_credentials")
+        if read_response is None:
+            return None
+        creds = read_response.get('data')
+        if not creds or 'username' not in creds or 'password' not in creds:
+            logging.error(f"Response tu Vault khong co du lieu credentials cho role '{role_name}'.")
+            return None
+        if 'lease_id' not in read_response or 'lease_duration' not in read_response:
+            logging.error(f"Response tu Vault thieu lease_id hoac lease_duration cho role '{role_name}'.")
+            return None
+
+        lease_id = read_response['lease_id']
+        logging.info(f"-> Lay thanh cong User: {creds['username']}, Lease ID: {lease_id[:8]}..., Duration: {read_response['lease_duration']}s")
+        return {
+            "username": creds['username'],
+            "password": creds['password'],
+            "lease_id": lease_id,
+            "lease_duration": read_response['lease_duration'],
+            "renewable": read_response.get('renewable', False)
+        }
+
+    async def revoke_lease(self, lease_id: str):
+        if self.session is None:
+            logging.warning("Khong co client Vault hop le de revoke lease.")
+            return
+        if not lease_id:
+            logging.warning("Khong co lease ID duoc cung cap de revoke.")
+            return
+        logging.info(f"Dang gui yeu cau revoke cho lease: {lease_id[:8]}...")
+        if await self._request("PUT", "sys/leases/revoke", "revoke_lease", {"lease_id": lease_id}) is not None:
+            logging.info(f"-> Yeu cau revoke cho lease {lease_id[:8]}... da duoc gui.")
+
+    async def renew_lease(self, lease_id: str, increment: int | None = None) -> dict | None:
+        if self.session is None:
+            logging.warning("Khong co client Vault hop le de renew lease.")
+            return None
+        if not lease_id:
+            logging.warning("Khong co lease ID duoc cung cap de renew.")
+            return None
+
+        payload = {"lease_id": lease_id}
+        if increment is not None:
+            payload["increment"] = increment
+        response = await self._request("PUT", "sys/leases/renew", "renew_lease", payload)
+        if not response or 'lease_duration' not in response:
+            logging.error(f"Khong renew duoc lease {lease_id[:8]}...")
+            return None
+        logging.info(f"-> Renew lease {lease_id[:8]}... thanh cong, Duration: {response['lease_duration']}s")
+        return {
+            "lease_id": response.get('lease_id') or lease_id,
+            "lease_duration": response['lease_duration'],
+            "renewable": response.get('renewable', False)
+        }
+
+    def start_lease_renewal(self, role_name: str, creds: dict, on_rotate) -> "AsyncLeaseRenewal":
+        """
+        Như VaultClient.start_lease_renewal nhưng hẹn giờ trên event loop
+        đang chạy (loop.call_later) thay vì một luồng cho mỗi lease.
+        `on_rotate(new_creds)` có thể là hàm thường hoặc coroutine.
+        """
+        renewal = AsyncLeaseRenewal(self, role_name, creds, on_rotate)
+        renewal.start()
+        return renewal
+
+
+class AsyncLeaseRenewal:
+    """Mỗi lease chỉ là một TimerHandle trên event loop, không có luồng riêng."""
+
+    def __init__(self, vault_client: AsyncVaultClient, role_name: str, creds: dict, on_rotate):
+        self.vault_client = vault_client
+        self.role_name = role_name
+        self.on_rotate = on_rotate
+        self.buffer_seconds = DEFAULT_LEASE_DURATION_WARNING_SECONDS if DEFAULT_LEASE_DURATION_WARNING_SECONDS > 0 else 10
+        self._loop = None
+        self._timer = None
+        self._task = None
+        self._stopped = False
+        self.number = next(_renewal_numbers)
+        self._set_lease(creds)
+
+    @property
+    def lease_id(self) -> str:
+        return self._lease_id
+
+    def time_remaining(self) -> float:
+        return self._expires_at - time.monotonic()
+
+    def _set_lease(self, lease: dict):
+        self._lease_id = lease['lease_id']
+        self._lease_duration = lease['lease_duration']
+        self.increment = LEASE_RENEW_INCREMENT_SECONDS or lease['lease_duration']
+        self._expires_at = time.monotonic() + lease['lease_duration']
+        self._needs_rotation = not lease.get('renewable', False)
+
+    def _next_delay(self) -> float:
+        remaining = self._expires_at - time.monotonic()
+        if self._needs_rotation:
+            return max(0, remaining - self.buffer_seconds)
+        renew_lead = max(self.buffer_seconds, self._lease_duration * (1 - LEASE_RENEW_THRESHOLD_RATIO))
+        return max(0, remaining - renew_lead)
+
+    def start(self):
+        """Phải gọi từ bên trong event loop đang chạy."""
+        self._loop = asyncio.get_running_loop()
+        self._schedule(self._next_delay())
+        LEASE_REMAINING.set_function(self.time_remaining, role=self.role_name, lease=str(self.number))
+        logging.info(f"[Renewal-{self.lease_id[:8]}] Bat dau tu dong gia han lease (async, increment: {self.increment}s)")
+
+    def stop(self) -> str:
+        """Hủy timer/lần gia hạn đang chạy và trả về lease ID hiện tại để caller revoke."""
+        self._stopped = True
+        if self._timer:
+            self._timer.cancel()
+        if self._task and not self._task.done():
+            self._task.cancel()
+        LEASE_REMAINING.remove(role=self.role_name, lease=str(self.number))
+        return self._lease_id
+
+    def _schedule(self, delay: float):
+        if not self._stopped:
+            self._timer = self._loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        self._task = self._loop.create_task(self._run_tick())
+
+    async def _run_tick(self):
+        try:
+            delay = await self._tick()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"[Renewal-{self._lease_id[:8]}] Loi khong mong doi khi gia han: {e}", exc_info=True)
+            delay = self._retry_delay()
+        self._schedule(delay)
+
+    async def _tick(self) -> float:
+        """Gia hạn hoặc xoay vòng lease, trả về số giây tới lần chạy sau."""
+        lease_id = self._lease_id
+        if not self._needs_rotation:
+            renewed = await self.vault_client.renew_lease(lease_id, increment=self.increment)
+            if renewed:
+                self._lease_duration = renewed['lease_duration']
+                self._expires_at = time.monotonic() + renewed['lease_duration']
+                if renewed['lease_duration'] < self.increment:
+                    self._needs_rotation = True
+                    logging.info(f"[Renewal-{lease_id[:8]}] Lease sap cham max TTL ({renewed['lease_duration']}s con lai), se xoay vong credentials.")
+                return self._next_delay()
+            logging.warning(f"[Renewal-{lease_id[:8]}] Khong the renew lease, chuyen sang xoay vong credentials.")
+        return await self._rotate(lease_id)
+
+    async def _rotate(self, old_lease_id: str) -> float:
+        new_creds = await self.vault_client.get_db_credentials(self.role_name)
+        if not new_creds:
+            logging.error(f"[Renewal-{old_lease_id[:8]}] Khong lay duoc credentials moi, se thu lai.")
+            return self._retry_delay()
+
+        try:
+            swapped = self.on_rotate(new_creds)
+            if inspect.isawaitable(swapped):
+                swapped = await swapped
+        except Exception as e:
+            logging.error(f"[Renewal-{old_lease_id[:8]}] Loi khi chuyen sang credentials moi: {e}")
+            swapped = False
+        if not swapped:
+            logging.error(f"[Renewal-{old_lease_id[:8]}] Khong chuyen duoc sang credentials moi, revoke lease moi va thu lai.")
+            await self.vault_client.revoke_lease(new_creds['lease_id'])
+            return self._retry_delay()
+
+        self._set_lease(new_creds)
+        logging.info(f"[Renewal-{old_lease_id[:8]}] Da xoay vong sang lease {new_creds['lease_id'][:8]}... (user: {new_creds['username']})")
+        await self.vault_client.revoke_lease(old_lease_id)
+        return self._next_delay()
+
+    def _retry_delay(self) -> float:
+        if self._expires_at - time.monotonic() <= self.buffer_seconds:
+            self._needs_rotation = True
+        return LEASE_RETRY_INTERVAL_SECONDS
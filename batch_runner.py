@@ -0,0 +1,189 @@
+import logging
+import re
+import sys
+import time
+from typing import TYPE_CHECKING
+from config import BATCH_TRANSACTION_SIZE, BATCH_PIPELINE_MAX_BYTES, SQL_FETCH_BATCH_SIZE
+from result_stream import iter_batches, write_rows
+
+if TYPE_CHECKING:
+    # Chi de chu thich kieu: tach lenh SQL khong can mysql.connector
+    from db_manager import DatabaseManager
+
+
+_QUOTE_END = {
+    "'": re.compile(r"\\.|''|'", re.S),
+    '"': re.compile(r'\\.|""|"', re.S),
+    "`": re.compile(r"``|`"),
+}
+
+
+def split_sql_statements(lines, delimiter: str = ";"):
+    """
+    Tách luồng dòng SQL thành từng lệnh, giống client mysql: bỏ qua delimiter
+    nằm trong chuỗi, tên `...` và comment, hỗ trợ lệnh DELIMITER. Trả về
+    (câu lệnh, dùng_delimiter_tùy_chỉnh) để caller biết lệnh nào là thân
+    procedure/trigger cần chạy riêng.
+    """
+    buf = []
+    has_code = False
+    quote = None
+    in_block_comment = False
+    token = _token_pattern(delimiter)
+
+    for line in lines:
+        if quote is None and not in_block_comment and not has_code:
+            stripped = line.strip()
+            if stripped[:10].upper() == "DELIMITER " or stripped.upper() == "DELIMITER":
+                new_delimiter = stripped[10:].strip()
+                if new_delimiter:
+                    delimiter = new_delimiter
+                    token = _token_pattern(delimiter)
+                buf = []
+                continue
+
+        pos = 0
+        end = len(line)
+        while pos < end:
+            if in_block_comment:
+                close = line.find("*/", pos)
+                if close < 0:
+                    buf.append(line[pos:])
+                    break
+                buf.append(line[pos:close + 2])
+                pos = close + 2
+                in_block_comment = False
+                continue
+
+            if quote:
+                match = _QUOTE_END[quote].search(line, pos)
+                while match and match.group() != quote:
+                    match = _QUOTE_END[quote].search(line, match.end())
+                if not match:
+                    buf.append(line[pos:])
+                    break
+                buf.append(line[pos:match.end()])
+                pos = match.end()
+                quote = None
+                continue
+
+            match = token.search(line, pos)
+            if not match:
+                chunk = line[pos:]
+                buf.append(chunk)
+                has_code = has_code or bool(chunk.strip())
+                break
+
+            chunk = line[pos:match.start()]
+            buf.append(chunk)
+            has_code = has_code or bool(chunk.strip())
+            found = match.group()
+            if found == delimiter:
+                statement = "".join(buf).strip()
+                if has_code:
+                    yield statement, delimiter != ";"
+                buf = []
+                has_code = False
+            elif found in _QUOTE_END:
+                buf.append(found)
+                quote = found
+                has_code = True
+            elif found == "/*":
+                buf.append(found)
+                in_block_comment = True
+            else:
+                # Comment '#' hoac '-- ' toi het dong
+                buf.append(line[match.start():])
+                break
+            pos = match.end()
+
+    if has_code:
+        yield "".join(buf).strip(), delimiter != ";"
+
+
+def _token_pattern(delimiter: str):
+    return re.compile(r"['\"`#]|--(?=\s|$)|/\*|" + re.escape(delimiter))
+
+
+class BatchRunner:
+
+    def __init__(
+        self,
+        db_manager: "DatabaseManager",
+        batch_size: int = BATCH_TRANSACTION_SIZE,
+        pipeline: bool = True,
+        stop_on_error: bool = True,
+        out=None
+    ):
+        self.db_manager = db_manager
+        self.batch_size = max(1, batch_size)
+        self.pipeline = pipeline
+        self.stop_on_error = stop_on_error
+        self.out = out or sys.stdout
+
+    def run(self, lines) -> dict:
+        """
+        Chạy toàn bộ script: gom các lệnh thành transaction `batch_size` lệnh
+        với một lần commit, và gửi nhiều lệnh trong một round trip khi bật
+        pipeline. Trả về thống kê của lần chạy.
+        """
+        stats = {"statements": 0, "batches": 0, "failed_batches": 0, "elapsed": 0.0}
+        start_time = time.perf_counter()
+        chunk = []
+        chunk_bytes = 0
+        in_transaction = 0
+        batch_ok = True
+
+        for statement, custom_delimiter in split_sql_statements(lines):
+            stats["statements"] += 1
+            in_transaction += 1
+            # Khi batch hien tai da loi thi bo qua cac lenh con lai cua batch do
+            if batch_ok and (custom_delimiter or not self.pipeline):
+                batch_ok = self._flush(chunk) and self._execute(statement)
+                chunk, chunk_bytes = [], 0
+            elif batch_ok:
+                chunk.append(statement)
+                chunk_bytes += len(statement)
+                if chunk_bytes >= BATCH_PIPELINE_MAX_BYTES:
+                    batch_ok = self._flush(chunk)
+                    chunk, chunk_bytes = [], 0
+
+            if in_transaction >= self.batch_size:
+                batch_ok = self._finish_batch(batch_ok and self._flush(chunk), stats)
+                chunk, chunk_bytes, in_transaction = [], 0, 0
+                if not batch_ok and self.stop_on_error:
+                    break
+                batch_ok = True
+
+        if in_transaction:
+            self._finish_batch(batch_ok and self._flush(chunk), stats)
+
+        stats["elapsed"] = time.perf_counter() - start_time
+        logging.info(
+            f"Batch ket thuc: {stats['statements']} lenh, {stats['batches']} batch "
+            f"({stats['failed_batches']} loi) trong {stats['elapsed']:.2f} giay."
+        )
+        return stats
+
+    def _finish_batch(self, ok: bool, stats: dict) -> bool:
+        stats["batches"] += 1
+        if ok:
+            self.db_manager.commit()
+            return True
+        stats["failed_batches"] += 1
+        logging.error(f"Batch thu {stats['batches']} gap loi, rollback toan bo batch.")
+        self.db_manager.rollback()
+        return False
+
+    def _flush(self, chunk: list) -> bool:
+        if not chunk:
+            return True
+        # Lenh co the ket thuc bang comment '--'/'#' toi het dong: delimiter phai sang dong moi
+        return self._execute("\n;\n".join(chunk))
+
+    def _execute(self, sql_script: str) -> bool:
+        return self.db_manager.execute_script(sql_script, on_result=self._print_result)
+
+    def _print_result(self, cursor):
+        columns = [col[0] for col in cursor.description]
+        write_rows(columns, iter_batches(cursor, SQL_FETCH_BATCH_SIZE), self.out)
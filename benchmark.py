@@ -0,0 +1,351 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from fake_vault import FakeVaultServer
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+BENCH_MYSQL_HOST = os.environ.get("BENCH_MYSQL_HOST", "127.0.0.1")
+BENCH_MYSQL_PORT = int(os.environ.get("BENCH_MYSQL_PORT", 3306))
+BENCH_MYSQL_USER = os.environ.get("BENCH_MYSQL_USER", "root")
+BENCH_MYSQL_PASSWORD = os.environ.get("BENCH_MYSQL_PASSWORD", "")
+BENCH_MYSQL_DB = os.environ.get("BENCH_MYSQL_DB", "bench")
+BENCH_TABLE = f"{BENCH_MYSQL_DB}.bench_rows"
+
+
+def summarize(name: str, samples: list, units: int = 1, **extra) -> dict:
+    """Thống kê độ trễ (giây) của các lần lặp; `units` là số đơn vị công việc mỗi lần (vd. số dòng)."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    result = {
+        "scenario": name,
+        "iterations": len(ordered),
+        "total_seconds": total,
+        "mean_seconds": statistics.fmean(ordered),
+        "p50_seconds": percentile(0.50),
+        "p95_seconds": percentile(0.95),
+        "p99_seconds": percentile(0.99),
+        "ops_per_second": len(ordered) / total if total > 0 else 0.0,
+        "units_per_second": len(ordered) * units / total if total > 0 else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def timed(function, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def synthetic_rows(count: int, width: int) -> list:
+    return [
+        tuple(
+            i if c % 3 == 0 else (f"value-{i}-{c}" if c % 3 == 1 else i * 1.25)
+            for c in range(width)
+        )
+        for i in range(count)
+    ]
+
+
+class BenchmarkSuite:
+
+    def __init__(self, iterations: int, rows: int):
+        self.iterations = iterations
+        self.rows = rows
+        self.vault = None
+        self.vault_client = None
+        self.db_manager = None
+        self.db_skip_reason = None
+
+    # ---------- chuan bi moi truong ----------
+
+    def setup(self):
+        from vault_client import VaultClient
+        self.vault = FakeVaultServer(BENCH_MYSQL_USER, BENCH_MYSQL_PASSWORD).start()
+        self.vault_client = VaultClient(vault_addr=self.vault.url, vault_token="bench-token")
+        self.db_manager = self._connect_db()
+
+    def _connect_db(self):
+        try:
+            from db_manager import DatabaseManager
+        except ImportError as e:
+            self.db_skip_reason = f"thieu mysql-connector: {e}"
+            return None
+        creds = self.vault_client.get_db_credentials("bench")
+        db_manager = DatabaseManager(host=BENCH_MYSQL_HOST, port=BENCH_MYSQL_PORT, pool_size=4,
+                                     allow_local_infile=True)
+        if not creds or not db_manager.connect(creds['username'], creds['password'], creds['lease_id']):
+            self.db_skip_reason = f"khong ket noi duoc MySQL tai {BENCH_MYSQL_HOST}:{BENCH_MYSQL_PORT}"
+            return None
+        for sql in (
+            f"CREATE DATABASE IF NOT EXISTS `{BENCH_MYSQL_DB}`",
+            f"DROP TABLE IF EXISTS {BENCH_TABLE}",
+            f"CREATE TABLE {BENCH_TABLE} (id INT PRIMARY KEY, name VARCHAR(64), score DOUBLE, "
+            f"note VARCHAR(255), created DATETIME)",
+        ):
+            cursor = db_manager.execute_sql(sql)
+            if cursor is None:
+                self.db_skip_reason = f"khong tao duoc bang benchmark ({sql})"
+                return None
+            cursor.close()
+        now = datetime.datetime(2024, 1, 1)
+        rows = [(i, f"name-{i}", i * 0.5, "x" * (i % 200), now) for i in range(self.rows)]
+        for start in range(0, len(rows), 5000):
+            db_manager.execute_many(
+                f"INSERT INTO {BENCH_TABLE} (id, name, score, note, created) VALUES (%s, %s, %s, %s, %s)",
+                rows[start:start + 5000]
+            )
+        db_manager.commit()
+        return db_manager
+
+    def teardown(self):
+        if self.db_manager:
+            cursor = self.db_manager.execute_sql(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            if cursor:
+                cursor.close()
+            self.db_manager.close()
+        if self.vault:
+            self.vault.stop()
+
+    # ---------- kich ban khong can MySQL ----------
+
+    def bench_vault_credentials(self) -> dict:
+        samples = timed(lambda: self.vault_client.get_db_credentials("bench"), self.iterations)
+        return summarize("vault_credentials", samples)
+
+    def bench_vault_renew_revoke(self) -> dict:
+        lease_ids = [self.vault_client.get_db_credentials("bench")['lease_id'] for _ in range(self.iterations)]
+        samples = []
+        for lease_id in lease_ids:
+            start = time.perf_counter()
+            self.vault_client.renew_lease(lease_id, increment=60)
+            self.vault_client.revoke_lease(lease_id)
+            samples.append(time.perf_counter() - start)
+        return summarize("vault_renew_revoke", samples)
+
+    def bench_render_tall(self) -> dict:
+        return self._bench_render("render_tall", synthetic_rows(self.rows, 5), 5)
+
+    def bench_render_wide(self) -> dict:
+        return self._bench_render("render_wide", synthetic_rows(max(1, self.rows // 20), 60), 60)
+
+    def bench_render_tall_table(self) -> dict:
+        return self._bench_render("render_tall_table", synthetic_rows(self.rows, 5), 5, "table")
+
+    def bench_render_wide_table(self) -> dict:
+        return self._bench_render("render_wide_table", synthetic_rows(max(1, self.rows // 20), 60), 60, "table")
+
+    def _bench_render(self, name: str, rows: list, width: int, fmt: str | None = None) -> dict:
+        from result_stream import write_rows
+        from result_renderer import ResultRenderer
+        columns = [f"col_{c}" for c in range(width)]
+        batches = [rows[i:i + 1000] for i in range(0, len(rows), 1000)]
+        render = ResultRenderer(fmt).render if fmt else write_rows
+        samples = timed(lambda: render(columns, iter(batches), io.StringIO()), max(1, self.iterations // 10))
+        return summarize(name, samples, units=len(rows), rows=len(rows), columns=width)
+
+    # ---------- kich ban can MySQL ----------
+
+    def bench_connect(self) -> dict:
+        creds = self.vault_client.get_db_credentials("bench")
+
+        def _connect_close():
+            connection = self.db_manager._open_connection(creds['username'], creds['password'])
+            if connection:
+                connection.close()
+
+        return summarize("connect", timed(_connect_close, self.iterations))
+
+    def bench_query_tall(self) -> dict:
+        return self._bench_query("query_tall", f"SELECT id, name, score, note, created FROM {BENCH_TABLE}")
+
+    def bench_query_wide(self) -> dict:
+        wide = ", ".join(f"name AS c{c}, score AS s{c}" for c in range(30))
+        return self._bench_query("query_wide", f"SELECT {wide} FROM {BENCH_TABLE} LIMIT {max(1, self.rows // 20)}")
+
+    def _bench_query(self, name: str, sql: str) -> dict:
+        from result_stream import iter_batches, write_rows
+        row_counts = []
+
+        def _run():
+            cursor = self.db_manager.execute_sql(sql)
+            columns = [col[0] for col in cursor.description]
+            row_counts.append(write_rows(columns, iter_batches(cursor, 1000), io.StringIO()))
+            cursor.close()
+
+        start = time.perf_counter()
+        first_row = []
+        cursor = self.db_manager.execute_sql(sql)
+        cursor.fetchmany(1)
+        first_row.append(time.perf_counter() - start)
+        self.db_manager.discard_unread_result()
+        cursor.close()
+
+        samples = timed(_run, max(1, self.iterations // 10))
+        return summarize(name, samples, units=row_counts[0] if row_counts else 0,
+                         rows=row_counts[0] if row_counts else 0, time_to_first_row_seconds=first_row[0])
+
+    def bench_many_small_statements(self) -> list:
+        from batch_runner import BatchRunner
+        results = []
+        script = [f"UPDATE {BENCH_TABLE} SET score = score + 1 WHERE id = {i % max(1, self.rows)};\n"
+                  for i in range(self.iterations * 10)]
+        for pipeline in (False, True):
+            runner = BatchRunner(self.db_manager, batch_size=1000, pipeline=pipeline, out=io.StringIO())
+            start = time.perf_counter()
+            stats = runner.run(iter(script))
+            elapsed = time.perf_counter() - start
+            results.append(summarize(f"many_small_statements_{'pipelined' if pipeline else 'serial'}",
+                                     [elapsed], units=stats['statements'], statements=stats['statements']))
+        return results
+
+    def bench_bulk_insert(self) -> list:
+        from bulk_loader import BulkLoader
+        results = []
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", delete=False) as data:
+            writer = csv.writer(data)
+            writer.writerow(["id", "name", "score", "note", "created"])
+            for i in range(self.rows):
+                writer.writerow([i, f"name-{i}", i * 0.5, "bulk", "2024-01-01 00:00:00"])
+        try:
+            for method in ("insert", "load_data"):
+                cursor = self.db_manager.execute_sql(f"TRUNCATE TABLE {BENCH_TABLE}")
+                if cursor:
+                    cursor.close()
+                stats = BulkLoader(self.db_manager).load(data.name, BENCH_TABLE, method=method)
+                if stats is None:
+                    results.append({"scenario": f"bulk_insert_{method}", "skipped": "nap du lieu that bai"})
+                    continue
+                results.append(summarize(f"bulk_insert_{method}", [stats['elapsed']], units=stats['rows'],
+                                         rows=stats['rows']))
+        finally:
+            os.unlink(data.name)
+        return results
+
+    def bench_rotation_under_load(self) -> dict:
+        """Đo độ trễ truy vấn từ pool trong khi liên tục xoay vòng credentials."""
+        stop = threading.Event()
+        latencies = []
+        rotations = []
+
+        def _worker():
+            while not stop.is_set():
+                start = time.perf_counter()
+                with self.db_manager.pooled_connection() as pooled:
+                    cursor = pooled.cursor()
+                    cursor.execute(f"SELECT COUNT(*) FROM {BENCH_TABLE}")
+                    cursor.fetchall()
+                    cursor.close()
+                latencies.append(time.perf_counter() - start)
+
+        workers = [threading.Thread(target=_worker, daemon=True) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for _ in range(max(1, self.iterations // 10)):
+            start = time.perf_counter()
+            creds = self.vault_client.get_db_credentials("bench")
+            self.db_manager.swap_credentials(creds['username'], creds['password'], creds['lease_id'])
+            rotations.append(time.perf_counter() - start)
+            time.sleep(0.05)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        return summarize("rotation_under_load", latencies, rotations=len(rotations),
+                         rotation_mean_seconds=statistics.fmean(rotations))
+
+    # ---------- dieu phoi ----------
+
+    SCENARIOS = {
+        "vault_credentials": (bench_vault_credentials, False),
+        "vault_renew_revoke": (bench_vault_renew_revoke, False),
+        "render_tall": (bench_render_tall, False),
+        "render_wide": (bench_render_wide, False),
+        "render_tall_table": (bench_render_tall_table, False),
+        "render_wide_table": (bench_render_wide_table, False),
+        "connect": (bench_connect, True),
+        "query_tall": (bench_query_tall, True),
+        "query_wide": (bench_query_wide, True),
+        "many_small_statements": (bench_many_small_statements, True),
+        "bulk_insert": (bench_bulk_insert, True),
+        "rotation_under_load": (bench_rotation_under_load, True),
+    }
+
+    def run(self, names: list) -> list:
+        results = []
+        for name in names:
+            function, needs_db = self.SCENARIOS[name]
+            if needs_db and self.db_manager is None:
+                results.append({"scenario": name, "skipped": self.db_skip_reason})
+                print(f"- {name}: bỏ qua ({self.db_skip_reason})")
+                continue
+            print(f"- {name}...", flush=True)
+            outcome = function(self)
+            results.extend(outcome if isinstance(outcome, list) else [outcome])
+        return results
+
+
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "mysql_host": f"{BENCH_MYSQL_HOST}:{BENCH_MYSQL_PORT}",
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark VaultClient, DatabaseManager và phần hiển thị kết quả.")
+    parser.add_argument("--scenarios", default=",".join(BenchmarkSuite.SCENARIOS),
+                        help="Danh sách kịch bản, ngăn cách bởi dấu phẩy.")
+    parser.add_argument("--iterations", type=int, default=200, help="Số lần lặp cho kịch bản đo độ trễ.")
+    parser.add_argument("--rows", type=int, default=100000, help="Số dòng dữ liệu cho kịch bản bảng cao/nạp dữ liệu.")
+    parser.add_argument("--output", default="bench_results.json", help="File JSON kết quả.")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BenchmarkSuite.SCENARIOS]
+    if unknown:
+        parser.error(f"Kịch bản không tồn tại: {', '.join(unknown)}")
+
+    suite = BenchmarkSuite(iterations=args.iterations, rows=args.rows)
+    try:
+        suite.setup()
+        results = suite.run(names)
+    finally:
+        suite.teardown()
+
+    report = {"environment": environment_info(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(report, out, indent=2, default=str)
+    print(f"Đã ghi kết quả benchmark ra {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
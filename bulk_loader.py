@@ -0,0 +1,162 @@
+import csv
+import logging
+import os
+import time
+from itertools import islice
+from config import BULK_BATCH_SIZE, BULK_COMMIT_ROWS, BULK_PROGRESS_INTERVAL_SECONDS
+from db_manager import DatabaseManager
+
+
+def quote_identifier(name: str) -> str:
+    """Quote tên bảng/cột, hỗ trợ dạng db.table."""
+    return ".".join("`" + part.replace("`", "``") + "`" for part in name.split("."))
+
+
+def quote_string(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class BulkLoader:
+    """
+    Nạp file CSV/TSV vào một bảng. Dùng LOAD DATA LOCAL INFILE khi client
+    và server đều cho phép, nếu không thì đọc file theo từng lô và chèn bằng
+    executemany (INSERT nhiều dòng), commit sau mỗi `commit_rows` dòng.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, batch_size: int = BULK_BATCH_SIZE,
+                 commit_rows: int = BULK_COMMIT_ROWS):
+        self.db_manager = db_manager
+        self.batch_size = max(1, batch_size)
+        self.commit_rows = max(self.batch_size, commit_rows)
+
+    def load(self, path: str, table: str, columns: list | None = None, delimiter: str | None = None,
+             header: bool = True, method: str = "auto") -> dict | None:
+        if delimiter is None:
+            delimiter = "\t" if path.lower().endswith((".tsv", ".tab")) else ","
+        if method == "auto":
+            method = "load_data" if self._local_infile_enabled() else "insert"
+        logging.info(f"Bat dau nap '{path}' vao bang {table} (phuong thuc: {method})...")
+
+        start_time = time.perf_counter()
+        if method == "load_data":
+            rows = self._load_data(path, table, columns, delimiter, header)
+        else:
+            rows = self._insert_batches(path, table, columns, delimiter, header)
+        if rows is None:
+            return None
+
+        elapsed = time.perf_counter() - start_time
+        stats = {
+            "rows": rows,
+            "method": method,
+            "elapsed": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+        }
+        logging.info(f"-> Da nap {rows} dong trong {elapsed:.2f} giay ({stats['rows_per_second']:.0f} dong/giay).")
+        return stats
+
+    def _local_infile_enabled(self) -> bool:
+        if not self.db_manager.allow_local_infile:
+            return False
+        cursor = self.db_manager.execute_sql("SELECT @@GLOBAL.local_infile", buffered=True)
+        if not cursor:
+            return False
+        try:
+            row = cursor.fetchone()
+            return bool(row and int(row[0]))
+        finally:
+            cursor.close()
+
+    def _load_data(self, path: str, table: str, columns: list | None, delimiter: str, header: bool) -> int | None:
+        file_columns, crlf = self._read_first_line(path, delimiter, header)
+        # Map cot theo header nhu nhanh INSERT, de cung mot file vao cung cac cot du server bat local_infile hay khong
+        columns = columns or file_columns
+        column_list = f" ({', '.join(quote_identifier(c) for c in columns)})" if columns else ""
+        # File CRLF ma tach theo '\n' se de lai '\r' o truong cuoi cua moi dong
+        line_end = "'\\r\\n'" if crlf else "'\\n'"
+        sql = (
+            f"LOAD DATA LOCAL INFILE {quote_string(os.path.abspath(path))} "
+            f"INTO TABLE {quote_identifier(table)} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY {quote_string(delimiter)} OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY {line_end}"
+            f"{' IGNORE 1 LINES' if header else ''}{column_list}"
+        )
+        cursor = self.db_manager.execute_sql(sql)
+        if not cursor:
+            self.db_manager.rollback()
+            return None
+        try:
+            rows = cursor.rowcount
+        finally:
+            cursor.close()
+        self.db_manager.commit()
+        return rows
+
+    def _insert_batches(self, path: str, table: str, columns: list | None, delimiter: str, header: bool) -> int | None:
+        with open(path, newline="", encoding="utf-8") as source:
+            reader = csv.reader(source, delimiter=delimiter)
+            file_columns = next(reader, None) if header else None
+            columns = columns or file_columns
+            # Khong co header/columns: INSERT khong kem danh sach cot (theo thu tu cot cua bang),
+            # so cot lay tu dong du lieu dau tien
+            width = len(columns) if columns else None
+            sql = None
+            total = 0
+            uncommitted = 0
+            start_time = time.perf_counter()
+            last_report = start_time
+            while True:
+                batch = list(islice(reader, self.batch_size))
+                if not batch:
+                    break
+                if width is None:
+                    width = next((len(row) for row in batch if row), None)
+                    if width is None:
+                        continue
+                if sql is None:
+                    sql = self._insert_sql(table, columns, width)
+                if any(len(row) != width for row in batch):
+                    # Dong trong (vd. cuoi file) khong phai loi
+                    batch = [row for row in batch if row]
+                if any(len(row) != width for row in batch):
+                    bad = next(i for i, row in enumerate(batch) if len(row) != width)
+                    logging.error(f"Dong {total + bad + 1 + int(header)} co so cot khac {width}, dung nap du lieu.")
+                    self._abort(total - uncommitted)
+                    return None
+                if batch and self.db_manager.execute_many(sql, batch) is None:
+                    self._abort(total - uncommitted)
+                    return None
+                total += len(batch)
+                uncommitted += len(batch)
+                if uncommitted >= self.commit_rows:
+                    self.db_manager.commit()
+                    uncommitted = 0
+
+                now = time.perf_counter()
+                if now - last_report >= BULK_PROGRESS_INTERVAL_SECONDS:
+                    logging.info(f"... da nap {total} dong ({total / (now - start_time):.0f} dong/giay)")
+                    last_report = now
+
+            self.db_manager.commit()
+            return total
+
+    @staticmethod
+    def _read_first_line(path: str, delimiter: str, header: bool) -> tuple[list | None, bool]:
+        """Trả về (các cột của header nếu có, file có dùng CRLF không) từ dòng đầu của file."""
+        with open(path, "rb") as source:
+            first = source.readline()
+        crlf = first.endswith(b"\r\n")
+        columns = None
+        if header and first.strip():
+            columns = next(csv.reader([first.decode("utf-8").rstrip("\r\n")], delimiter=delimiter), None)
+        return columns, crlf
+
+    @staticmethod
+    def _insert_sql(table: str, columns: list | None, width: int) -> str:
+        column_list = f" ({', '.join(quote_identifier(c) for c in columns)})" if columns else ""
+        return f"INSERT INTO {quote_identifier(table)}{column_list} VALUES ({', '.join(['%s'] * width)})"
+
+    def _abort(self, committed_rows: int):
+        self.db_manager.rollback()
+        if committed_rows:
+            logging.warning(f"{committed_rows} dong da duoc commit truoc khi gap loi va van nam trong bang.")
@@ -1,7 +1,23 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+
+def _find_env_file() -> str | None:
+    """Tìm .env từ thư mục chứa file này đi lên (như find_dotenv) mà không cần import dotenv."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+_ENV_FILE = _find_env_file()
+if _ENV_FILE:
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
 
 VAULT_ADDR = os.environ.get("VAULT_ADDR", "http://192.168.132.135:8200")
 VAULT_TOKEN = os.environ.get("VAULT_TOKEN")
@@ -14,4 +30,84 @@ MYSQL_PORT = int(os.environ.get("MYSQL_PORT", 3306))
 MYSQL_INITIAL_DB = None
 
 
-DEFAULT_LEASE_DURATION_WARNING_SECONDS = 10
\ No newline at end of file
+DEFAULT_LEASE_DURATION_WARNING_SECONDS = 10
+
+# Gia hạn lease khi đã dùng hết tỉ lệ này của thời hạn hiện tại
+LEASE_RENEW_THRESHOLD_RATIO = 2 / 3
+# Thời gian xin thêm mỗi lần renew (0 = dùng lại lease_duration ban đầu)
+LEASE_RENEW_INCREMENT_SECONDS = int(os.environ.get("LEASE_RENEW_INCREMENT_SECONDS", 0))
+# Chờ bao lâu trước khi thử lại khi renew/xoay vòng credentials thất bại
+LEASE_RETRY_INTERVAL_SECONDS = 5
+
+# Pool kết nối MySQL (0 = chỉ dùng một kết nối như cũ)
+MYSQL_POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", 0))
+MYSQL_POOL_IDLE_TIMEOUT_SECONDS = 300
+MYSQL_POOL_ACQUIRE_TIMEOUT_SECONDS = 30
+
+# Sức sống kết nối: tin kết nối vừa hoạt động trong số giây này mà không ping, ping nền khi rảnh quá
+# MYSQL_KEEPALIVE_INTERVAL_SECONDS (0 = tắt keepalive)
+MYSQL_HEALTH_TRUST_SECONDS = 60
+MYSQL_KEEPALIVE_INTERVAL_SECONDS = int(os.environ.get("MYSQL_KEEPALIVE_INTERVAL_SECONDS", 30))
+# Thử lại khi gặp lỗi tạm thời (mất kết nối, lock wait timeout, deadlock): số lần, backoff ban đầu và tối đa (giây)
+MYSQL_RETRY_ATTEMPTS = 3
+MYSQL_RETRY_BASE_DELAY_SECONDS = 0.1
+MYSQL_RETRY_MAX_DELAY_SECONDS = 2.0
+
+# Hiển thị kết quả dạng stream: số dòng mỗi lần fetchmany, giới hạn dòng (0 = không giới hạn), pager
+SQL_FETCH_BATCH_SIZE = 1000
+SQL_MAX_ROWS = int(os.environ.get("SQL_MAX_ROWS", 0))
+SQL_PAGER = os.environ.get("SQL_PAGER")
+# Kiểu hiển thị kết quả trong phiên tương tác (table, vertical, plain, stats) và độ rộng tối đa mỗi cột (0 = không cắt)
+SQL_OUTPUT_FORMAT = os.environ.get("SQL_OUTPUT_FORMAT", "table")
+SQL_MAX_COLUMN_WIDTH = int(os.environ.get("SQL_MAX_COLUMN_WIDTH", 80))
+# Số dòng đầu được giữ lại để đo độ rộng cột trước khi in bảng; dòng sau dài hơn bị cắt theo độ rộng đó
+SQL_ALIGN_SAMPLE_ROWS = 10000
+
+# Chế độ batch: số lệnh mỗi transaction (một lần commit) và kích thước tối đa một lần gửi nhiều lệnh
+BATCH_TRANSACTION_SIZE = 1000
+BATCH_PIPELINE_MAX_BYTES = 1024 * 1024
+
+# Thực thi song song: thời gian tối đa cho mỗi truy vấn trước khi bị KILL QUERY
+PARALLEL_QUERY_TIMEOUT_SECONDS = 300
+
+# Nạp dữ liệu hàng loạt: số dòng mỗi lệnh INSERT nhiều dòng, số dòng giữa hai lần commit
+BULK_BATCH_SIZE = 5000
+BULK_COMMIT_ROWS = 100000
+BULK_PROGRESS_INTERVAL_SECONDS = 5
+# Cho phép LOAD DATA LOCAL INFILE (server cũng phải bật local_infile)
+MYSQL_ALLOW_LOCAL_INFILE = os.environ.get("MYSQL_ALLOW_LOCAL_INFILE", "false").lower() in ("1", "true", "yes")
+
+# Xuất kết quả ra file: các định dạng hỗ trợ, mức nén gzip (1 nhanh nhất - 9 nhỏ nhất)
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_GZIP_LEVEL = 3
+
+# Số prepared statement giữ lại trên mỗi kết nối (LRU)
+PREPARED_STATEMENT_CACHE_SIZE = 64
+
+# Cache kết quả đọc (0 = tắt): dung lượng tối đa (byte, ước tính) và TTL mặc định mỗi entry
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 0))
+RESULT_CACHE_TTL_SECONDS = 60
+
+# Metrics: cổng HTTP (0 = tắt) và file snapshot (.json hoặc text Prometheus) ghi định kỳ
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_FILE_INTERVAL_SECONDS = 15
+
+# API asyncio: số kết nối HTTP tối đa tới Vault và kích thước pool aiomysql
+ASYNC_VAULT_MAX_CONNECTIONS = 100
+ASYNC_MYSQL_POOL_MIN_SIZE = 1
+ASYNC_MYSQL_POOL_MAX_SIZE = int(os.environ.get("ASYNC_MYSQL_POOL_MAX_SIZE", 20))
+
+# Bộ lập lịch lease dùng chung: số worker chạy renew/xoay vòng/revoke, thời gian chờ revoke hàng loạt khi thoát
+LEASE_SCHEDULER_WORKERS = 4
+LEASE_REVOKE_TIMEOUT_SECONDS = 30
+
+# Chế độ gateway (--serve): kích thước pool mặc định, thời gian giữ phiên rảnh, token bảo vệ (tùy chọn)
+GATEWAY_POOL_SIZE = int(os.environ.get("GATEWAY_POOL_SIZE", 16))
+GATEWAY_SESSION_TTL_SECONDS = 600
+GATEWAY_MAX_ROWS = int(os.environ.get("GATEWAY_MAX_ROWS", 0))
+GATEWAY_TOKEN = os.environ.get("GATEWAY_TOKEN")
+
+# Credentials dự phòng: số bộ tạo sẵn cho mỗi role (0 = tắt), thay spare khi còn ít hơn số giây này
+CREDENTIAL_SPARES_PER_ROLE = int(os.environ.get("CREDENTIAL_SPARES_PER_ROLE", 0))
+CREDENTIAL_REFRESH_AHEAD_SECONDS = 300
@@ -0,0 +1,91 @@
+import random
+import re
+import threading
+import time
+from config import (
+    MYSQL_HEALTH_TRUST_SECONDS, MYSQL_KEEPALIVE_INTERVAL_SECONDS,
+    MYSQL_RETRY_BASE_DELAY_SECONDS, MYSQL_RETRY_MAX_DELAY_SECONDS,
+)
+from query_cache import statement_keyword
+
+# CR_SERVER_GONE_ERROR, CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED: kết nối đã mất
+CONNECTION_LOST_ERRNOS = frozenset({2006, 2013, 2055})
+# ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK: chạy lại thường thành công
+LOCK_CONFLICT_ERRNOS = frozenset({1205, 1213})
+
+READ_KEYWORDS = frozenset({"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"})
+# Lệnh kết thúc transaction hiện tại (COMMIT/ROLLBACK, hoặc commit ngầm như DDL, BEGIN)
+ENDS_TRANSACTION_KEYWORDS = frozenset({
+    "COMMIT", "ROLLBACK", "BEGIN", "START", "ALTER", "DROP", "CREATE", "RENAME", "TRUNCATE",
+})
+# SELECT ... FOR UPDATE/INTO giữ khóa hoặc ghi ra ngoài. Khớp cả trong chuỗi literal
+# chỉ khiến lệnh không được chạy lại, không bao giờ chạy lại nhầm
+_NOT_IDEMPOTENT = re.compile(r"\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bINTO\b", re.I)
+
+
+def is_idempotent_read(sql_command: str) -> bool:
+    return statement_keyword(sql_command) in READ_KEYWORDS and not _NOT_IDEMPOTENT.search(sql_command)
+
+
+def backoff_delays(attempts: int, base_delay: float = MYSQL_RETRY_BASE_DELAY_SECONDS,
+                   max_delay: float = MYSQL_RETRY_MAX_DELAY_SECONDS):
+    """Thời gian chờ trước mỗi lần thử lại: exponential backoff với full jitter."""
+    for attempt in range(attempts):
+        yield random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class ConnectionHealth:
+    """
+    Theo dõi sức sống của một kết nối mà không tốn round trip: mỗi lệnh
+    thành công cập nhật thời điểm hoạt động cuối, lỗi mất kết nối đánh dấu
+    hỏng. Kết nối chỉ phải ping thật khi đã rảnh quá `trust_seconds`; luồng
+    keepalive ping trước mốc đó nên kiểm tra gần như luôn miễn phí.
+    """
+
+    def __init__(self, trust_seconds: float = MYSQL_HEALTH_TRUST_SECONDS,
+                 keepalive_interval: float = MYSQL_KEEPALIVE_INTERVAL_SECONDS):
+        self.trust_seconds = trust_seconds
+        self.keepalive_interval = keepalive_interval
+        self.last_activity = time.monotonic()
+        self.broken = False
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def mark_active(self):
+        self.last_activity = time.monotonic()
+        self.broken = False
+
+    def mark_broken(self):
+        self.broken = True
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    def is_trusted(self) -> bool:
+        return not self.broken and self.idle_for() < self.trust_seconds
+
+    def start_keepalive(self, ping):
+        """
+        Gọi `ping()` ở luồng nền mỗi khi kết nối rảnh quá keepalive_interval.
+        `ping` tự bỏ qua nếu kết nối đang bận và tự gọi mark_active/mark_broken.
+        """
+        if self.keepalive_interval <= 0 or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._keepalive_loop, args=(ping,), name="MySQLKeepalive", daemon=True)
+        self._thread.start()
+
+    def _keepalive_loop(self, ping):
+        while True:
+            wait = self.keepalive_interval - self.idle_for()
+            if wait <= 0:
+                ping()
+                wait = self.keepalive_interval
+            if self._stopped.wait(wait):
+                return
+
+    def stop_keepalive(self, timeout: float | None = 5):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from mysql.connector import Error
+from metrics import POOL_ACQUIRE_LATENCY
+from prepared_cache import PreparedStatementCache
+
+
+class PooledConnection:
+    """Một kết nối trong pool, gắn với lease Vault đã sinh ra credentials của nó."""
+
+    def __init__(self, connection, lease_id: str | None, username: str, database: str | None = None):
+        self.connection = connection
+        self.lease_id = lease_id
+        self.username = username
+        # Schema luc mo ket noi va schema dang chon, theo doi o day de khong phai hoi lai server
+        self.default_database = database
+        self.database = database
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Nguoi muon danh dau khi ket noi khong con dung lai duoc, pool se dong no khi tra ve
+        self.broken = False
+        self.statements = PreparedStatementCache(connection)
+
+    def cursor(self, *args, **kwargs):
+        self.statements.drain()
+        return self.connection.cursor(*args, **kwargs)
+
+    def execute(self, sql_command: str, params=()):
+        """Thực thi qua prepared statement cache của kết nối này (xem PreparedStatementCache)."""
+        return self.statements.execute(sql_command, params)
+
+    def use_database(self, database: str):
+        """Chọn schema cho kết nối, chỉ gửi USE khi khác schema đang chọn. Pool đặt lại khi trả về."""
+        if database and database != self.database:
+            self.connection.database = database
+            self.database = database
+
+    def reset_database(self) -> bool:
+        """
+        Quay về schema lúc mở kết nối. Trả về False nếu không quay về được:
+        kết nối mở không chọn schema nào thì không có lệnh USE để bỏ chọn.
+        """
+        if self.database == self.default_database:
+            return True
+        if self.default_database is None:
+            return False
+        self.connection.database = self.default_database
+        self.database = self.default_database
+        return True
+
+    def is_alive(self, max_idle: float) -> bool:
+        """Chỉ ping server khi kết nối đã rảnh quá `max_idle` giây (server có thể đã đóng nó)."""
+        now = time.monotonic()
+        if now - self.last_used > max_idle:
+            try:
+                self.connection.ping(reconnect=False)
+            except Error as e:
+                logging.info(f"Ket noi ranh trong pool khong con song (user: {self.username}): {e}")
+                return False
+        self.last_used = now
+        return True
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.statements.clear(release=False)
+        try:
+            self.connection.close()
+        except Error as e:
+            logging.warning(f"Loi khi dong ket noi trong pool (user: {self.username}): {e}")
+
+
+class ConnectionPool:
+
+    def __init__(self, connect_factory, pool_size: int, idle_timeout: float, acquire_timeout: float,
+                 validate_after: float = 0, database: str | None = None):
+        # connect_factory(username, password) -> ket noi mysql.connector hoac None, mo tren schema `database`
+        self.connect_factory = connect_factory
+        self.database = database
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        # Ket noi ranh lau hon so giay nay duoc ping truoc khi cho muon (0 = khong kiem tra)
+        self.validate_after = validate_after
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._username = None
+        self._password = None
+        self._lease_id = None
+
+    def set_credentials(self, username: str, password: str, lease_id: str | None = None):
+        """
+        Chuyển pool sang credentials mới. Kết nối rảnh của lease cũ bị đóng
+        ngay; kết nối đang được dùng sẽ bị đóng khi được trả về pool.
+        """
+        with self._cond:
+            self._username = username
+            self._password = password
+            self._lease_id = lease_id
+            stale = [pc for pc in self._idle if pc.lease_id != lease_id]
+            self._idle = [pc for pc in self._idle if pc.lease_id == lease_id]
+            self._size -= len(stale)
+            self._cond.notify_all()
+        for pc in stale:
+            pc.close()
+        if stale:
+            logging.info(f"Da dong {len(stale)} ket noi ranh cua lease cu trong pool.")
+
+    def checkout(self, timeout: float | None = None) -> PooledConnection | None:
+        start_time = time.perf_counter()
+        while True:
+            pooled = self._checkout(timeout)
+            if pooled is None or not self.validate_after or pooled.is_alive(self.validate_after):
+                break
+            self.checkin(pooled, discard=True)
+        POOL_ACQUIRE_LATENCY.observe(time.perf_counter() - start_time, result="ok" if pooled else "failed")
+        return pooled
+
+    def _checkout(self, timeout: float | None) -> PooledConnection | None:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self.evict_idle()
+        with self._cond:
+            while True:
+                if self._closed:
+                    logging.error("Pool da dong, khong the lay ket noi.")
+                    return None
+                if self._idle:
+                    # last_used duoc cap nhat o is_alive()/checkin(), o day van la luc bat dau ranh
+                    return self._idle.pop()
+                if self._size < self.pool_size:
+                    self._size += 1
+                    username, password, lease_id = self._username, self._password, self._lease_id
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.error(f"Het thoi gian cho ket noi tu pool ({timeout}s).")
+                    return None
+                self._cond.wait(remaining)
+
+        # Bắt tay TCP/auth nằm ngoài lock để không chặn các luồng trả kết nối
+        connection = self.connect_factory(username, password) if username else None
+        if connection is None:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return None
+        return PooledConnection(connection, lease_id, username, self.database)
+
+    def open_unpooled(self):
+        """Mở một kết nối riêng bằng credentials hiện tại, không tính vào giới hạn pool."""
+        with self._cond:
+            username, password = self._username, self._password
+        if not username:
+            return None
+        return self.connect_factory(username, password)
+
+    def checkin(self, pooled: PooledConnection, discard: bool = False):
+        with self._cond:
+            stale = self._closed or pooled.lease_id != self._lease_id
+        discard = discard or pooled.broken
+        if not discard and not stale:
+            try:
+                if pooled.connection.in_transaction:
+                    pooled.connection.rollback()
+                # Nguoi muon sau khong duoc chay nham tren schema nguoi truoc da chon
+                if not pooled.reset_database():
+                    logging.debug(f"Ket noi dang o schema {pooled.database}, khong dat lai duoc, dong ket noi.")
+                    discard = True
+            except Error as e:
+                logging.warning(f"Loi khi rollback ket noi tra ve pool: {e}")
+                discard = True
+        if discard or stale:
+            pooled.close()
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._cond:
+            expired = [pc for pc in self._idle if now - pc.last_used > self.idle_timeout]
+            if not expired:
+                return
+            self._idle = [pc for pc in self._idle if now - pc.last_used <= self.idle_timeout]
+            self._size -= len(expired)
+            self._cond.notify_all()
+        for pc in expired:
+            pc.close()
+        logging.debug(f"Da dong {len(expired)} ket noi ranh qua {self.idle_timeout}s.")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle), "max": self.pool_size}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pc in idle:
+            pc.close()
+        logging.info(f"Da dong pool ket noi ({len(idle)} ket noi ranh).")
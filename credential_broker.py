@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import CREDENTIAL_SPARES_PER_ROLE, CREDENTIAL_REFRESH_AHEAD_SECONDS, LEASE_RETRY_INTERVAL_SECONDS
+from metrics import BROKER_REQUESTS, BROKER_SPARES
+
+
+class CredentialBroker:
+    """
+    Giữ sẵn `spares_per_role` bộ credentials dự phòng cho mỗi role, được tạo
+    trước ở luồng nền, để kết nối/xoay vòng không phải chờ Vault tạo user
+    MySQL. Spare sắp hết hạn (còn ít hơn cửa sổ refresh-ahead) bị revoke và
+    thay bằng spare mới; spare chưa dùng bị revoke khi close().
+    """
+
+    def __init__(self, vault_client, spares_per_role: int = CREDENTIAL_SPARES_PER_ROLE,
+                 refresh_ahead: float = CREDENTIAL_REFRESH_AHEAD_SECONDS):
+        self.vault_client = vault_client
+        self.spares_per_role = max(1, spares_per_role)
+        self.refresh_ahead = refresh_ahead
+        self._cond = threading.Condition()
+        # role -> deque[(creds, thoi diem het han)]
+        self._spares = {}
+        self._stopped = False
+        self._thread = threading.Thread(target=self._fill_loop, name="CredentialBroker", daemon=True)
+        self._thread.start()
+        BROKER_SPARES.set_function(self.spare_count)
+
+    def warm(self, role_name: str):
+        """Đăng ký role để luồng nền bắt đầu tạo spare cho nó."""
+        with self._cond:
+            self._spares.setdefault(role_name, deque())
+            self._cond.notify_all()
+
+    def acquire(self, role_name: str) -> dict | None:
+        """
+        Lấy một spare còn hạn (lease_duration là thời gian còn lại), nếu không
+        có thì gọi Vault trực tiếp. Luồng nền sẽ bù lại spare vừa dùng.
+        """
+        now = time.monotonic()
+        with self._cond:
+            spares = self._spares.setdefault(role_name, deque())
+            # Spare da vao cua so refresh-ahead duoc bo qua, luong nen se revoke
+            for index, (creds, expires_at) in enumerate(spares):
+                if expires_at - now > self._window(creds):
+                    del spares[index]
+                    self._cond.notify_all()
+                    BROKER_REQUESTS.inc(result="hit")
+                    logging.info(f"Dung credentials du phong cho role '{role_name}' (user: {creds['username']}).")
+                    return {**creds, "lease_duration": int(expires_at - now)}
+            self._cond.notify_all()
+        BROKER_REQUESTS.inc(result="miss")
+        return self.vault_client.get_db_credentials(role_name)
+
+    def spare_count(self, role_name: str | None = None) -> int:
+        with self._cond:
+            if role_name is not None:
+                return len(self._spares.get(role_name, ()))
+            return sum(len(spares) for spares in self._spares.values())
+
+    def _window(self, creds: dict) -> float:
+        # Lease ngan: khong de cua so chiem qua nua thoi han, tranh tao lai lien tuc
+        return min(self.refresh_ahead, creds['lease_duration'] / 2)
+
+    def _fill_loop(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                stale = []
+                missing = []
+                now = time.monotonic()
+                for role_name, spares in self._spares.items():
+                    fresh = deque((c, e) for c, e in spares if e - now > self._window(c))
+                    stale.extend(c for c, e in spares if e - now <= self._window(c))
+                    self._spares[role_name] = fresh
+                    missing.extend([role_name] * (self.spares_per_role - len(fresh)))
+
+            for creds in stale:
+                logging.info(f"Spare cua user {creds['username']} sap het han, revoke va tao spare moi.")
+                self.vault_client.revoke_lease(creds['lease_id'])
+
+            failed = False
+            for role_name in missing:
+                creds = self.vault_client.get_db_credentials(role_name)
+                if not creds:
+                    failed = True
+                    continue
+                with self._cond:
+                    if self._stopped:
+                        # close() da chay trong luc dang tao, revoke ngay
+                        orphan = creds
+                    else:
+                        orphan = None
+                        self._spares.setdefault(role_name, deque()).append(
+                            (creds, time.monotonic() + creds['lease_duration'])
+                        )
+                if orphan:
+                    self.vault_client.revoke_lease(orphan['lease_id'])
+                    return
+
+            with self._cond:
+                if self._stopped:
+                    return
+                self._cond.wait(LEASE_RETRY_INTERVAL_SECONDS if failed else self._next_wake())
+
+    def _next_wake(self) -> float | None:
+        """Số giây tới khi spare sớm nhất vào cửa sổ refresh-ahead (None = chờ tới khi được đánh thức)."""
+        deadlines = [
+            expires_at - self._window(creds)
+            for spares in self._spares.values()
+            for creds, expires_at in spares
+        ]
+        if any(len(spares) < self.spares_per_role for spares in self._spares.values()):
+            return 0
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - time.monotonic())
+
+    def close(self, revoke: bool = True, timeout: float | None = 5):
+        """Dừng luồng nền và (nếu `revoke`) revoke đồng thời mọi spare chưa dùng."""
+        with self._cond:
+            self._stopped = True
+            unused = [creds for spares in self._spares.values() for creds, _ in spares]
+            self._spares.clear()
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        BROKER_SPARES.remove()
+        if revoke and unused:
+            with ThreadPoolExecutor(max_workers=min(8, len(unused)), thread_name_prefix="BrokerRevoke") as executor:
+                list(executor.map(lambda creds: self.vault_client.revoke_lease(creds['lease_id']), unused))
+            logging.info(f"Da revoke {len(unused)} credentials du phong chua dung.")
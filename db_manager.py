@@ -1,104 +1,783 @@
 import mysql.connector
 from mysql.connector import Error
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import (
+    MYSQL_POOL_IDLE_TIMEOUT_SECONDS, MYSQL_POOL_ACQUIRE_TIMEOUT_SECONDS, MYSQL_HEALTH_TRUST_SECONDS, MYSQL_RETRY_ATTEMPTS,
+    SQL_FETCH_BATCH_SIZE,
+)
+from connection_pool import ConnectionPool
+from connection_health import (
+    ConnectionHealth, CONNECTION_LOST_ERRNOS, LOCK_CONFLICT_ERRNOS, READ_KEYWORDS, ENDS_TRANSACTION_KEYWORDS,
+    backoff_delays, is_idempotent_read,
+)
+from prepared_cache import PreparedStatementCache
+from metrics import (
+    QUERY_LATENCY, QUERY_ERRORS, CONNECT_LATENCY, POOL_CONNECTIONS, QUERY_RETRIES, DB_RECONNECTS, DB_KEEPALIVE_PINGS,
+    estimate_row_bytes,
+)
+from query_cache import (
+    QueryResultCache, classify_write, classify_script, is_cacheable, referenced_tables, statement_keyword, use_target,
+)
+from result_stream import iter_batches
+
+# Loi server tra ve cho cau lenh bi KILL QUERY
+_ER_QUERY_INTERRUPTED = 1317
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class DatabaseManager:
 
-    def __init__(self, host: str, port: int, initial_db: str | None = None):
+    def __init__(self, host: str, port: int, initial_db: str | None = None, pool_size: int = 0,
+                 allow_local_infile: bool = False):
         self.host = host
         self.port = port
         self.initial_db = initial_db
+        self.allow_local_infile = allow_local_infile
         self.connection = None
         self.dynamic_user = None
+        self.lease_id = None
+        self._lock = threading.Lock()
+        # Giu khi gui lenh len self.connection, de ping keepalive khong chen giua mot lenh
+        self._io_lock = threading.RLock()
+        self._credentials = None
+        self._database = initial_db
+        self._uncommitted_writes = False
+        self._explicit_transaction = False
+        # (ket noi, user, lease) cua credentials moi, cho transaction tren ket noi hien tai ket thuc
+        self._staged_connection = None
+        self.health = ConnectionHealth()
+        self._retired_connections = []
+        self._control_connection = None
+        self._control_lock = threading.Lock()
+        self._statement_cache = None
+        self.result_cache = None
+        self._pending_invalidation = set()
+        self.pool = None
+        if pool_size > 0:
+            self.pool = ConnectionPool(
+                connect_factory=self._open_connection,
+                pool_size=pool_size,
+                idle_timeout=MYSQL_POOL_IDLE_TIMEOUT_SECONDS,
+                acquire_timeout=MYSQL_POOL_ACQUIRE_TIMEOUT_SECONDS,
+                validate_after=MYSQL_HEALTH_TRUST_SECONDS,
+                database=initial_db
+            )
+            pool = self.pool
+            POOL_CONNECTIONS.set_function(lambda: pool.stats()['idle'], state="idle")
+            POOL_CONNECTIONS.set_function(lambda: pool.stats()['in_use'], state="in_use")
 
-    def connect(self, username: str, password: str) -> bool:
+    def connect(self, username: str, password: str, lease_id: str | None = None) -> bool:
         logging.info(f"dang ket noi den mysql ({self.host}:{self.port}) bang user: {username}...")
+        connection = self._open_connection(username, password)
+        if connection is None:
+            self.connection = None
+            return False
+        with self._lock:
+            self.connection = connection
+            self.dynamic_user = username
+            self.lease_id = lease_id
+            self._credentials = (username, password)
+        if self.pool:
+            self.pool.set_credentials(username, password, lease_id)
+        self.health.mark_active()
+        self.health.start_keepalive(self._keepalive_ping)
+        logging.info("-> ket noi thanh cong")
+        return True
+
+    def swap_credentials(self, username: str, password: str, lease_id: str | None = None) -> bool:
+        """
+        Mở kết nối mới bằng credentials mới rồi thay thế kết nối hiện tại.
+        Kết nối cũ không bị đóng ngay mà được đóng ở lệnh SQL kế tiếp, để
+        không cắt ngang cursor đang đọc dở. Nếu kết nối hiện tại đang có
+        transaction mở, kết nối mới chỉ được dùng sau commit/rollback kế tiếp
+        để thay đổi chưa commit không bị rollback ngầm.
+        """
+        logging.info(f"dang chuyen ket noi sang user moi: {username}...")
+        connection = self._open_connection(username, password)
+        if connection is None:
+            return False
+        with self._lock:
+            self._credentials = (username, password)
+            current = self.connection
+            staged = current is not None and self._in_transaction(current)
+            if staged:
+                previous = self._staged_connection
+                self._staged_connection = (connection, username, lease_id)
+                if previous is not None:
+                    # Hai lan xoay vong trong cung mot transaction: ket noi cho truoc do khong con dung
+                    self._retired_connections.append(previous[0])
+        if self.pool:
+            self.pool.set_credentials(username, password, lease_id)
+        self._close_control_connection()
+        if staged:
+            logging.info(f"-> ket noi hien tai dang co transaction, se chuyen sang user {username} sau commit/rollback.")
+            return True
+        self._switch_connection(connection, username, lease_id)
+        logging.info(f"-> da chuyen sang user: {username}")
+        return True
+
+    def _in_transaction(self, connection) -> bool:
+        # in_transaction doc co trang thai server gui kem goi tin cuoi, khong ton round trip
+        return self._uncommitted_writes or self._explicit_transaction or connection.in_transaction
+
+    def _switch_connection(self, connection, username: str, lease_id: str | None):
+        with self._lock:
+            if self.connection is not None:
+                self._retired_connections.append(self.connection)
+            self.connection = connection
+            self.dynamic_user = username
+            self.lease_id = lease_id
+        self.health.mark_active()
+
+    def _apply_staged_connection(self) -> bool:
+        """Chuyển sang kết nối của credentials mới đã chờ sẵn (nếu có)."""
+        with self._lock:
+            staged = self._staged_connection
+            self._staged_connection = None
+        if staged is None:
+            return False
+        connection, username, lease_id = staged
+        self._switch_connection(connection, username, lease_id)
+        self._uncommitted_writes = False
+        self._explicit_transaction = False
+        logging.info(f"-> transaction da ket thuc, da chuyen sang user: {username}")
+        return True
+
+    @contextmanager
+    def pooled_connection(self, timeout: float | None = None):
+        """
+        Mượn một kết nối từ pool, tự trả lại khi thoát khỏi khối `with`.
+        Kết nối gặp lỗi MySQL sẽ bị loại khỏi pool thay vì dùng lại.
+        """
+        if not self.pool:
+            raise RuntimeError("DatabaseManager khong bat che do pool (pool_size=0).")
+        pooled = self.pool.checkout(timeout)
+        if pooled is None:
+            raise ConnectionError("Khong lay duoc ket noi tu pool.")
+        discard = False
+        try:
+            yield pooled
+        except Error:
+            discard = True
+            raise
+        finally:
+            self.pool.checkin(pooled, discard=discard)
+
+    def _open_connection(self, username: str, password: str):
+        start_time = time.perf_counter()
         try:
-            self.connection = mysql.connector.connect(
+            connection = mysql.connector.connect(
                 host=self.host,
                 port=self.port,
                 user=username,
                 password=password,
                 database=self.initial_db,
-               
+                allow_local_infile=self.allow_local_infile,
             )
-            if self.connection.is_connected():
-                self.dynamic_user = username
-                logging.info("-> ket noi thanh cong")
-                return True
+            if connection.is_connected():
+                CONNECT_LATENCY.observe(time.perf_counter() - start_time)
+                return connection
             else:
                 logging.warning("ket noi khong thanh cong (sau khi connect tra ve)")
-                self.connection = None 
-                return False
+                return None
         except Error as e:
             logging.error(f"loi khi ket noi: {e}")
-            self.connection = None
-            return False
+            return None
         except Exception as e: 
             logging.error(f"loi khong mong doi khi ket noi: {e}")
-            self.connection = None
-            return False
+            return None
+
+    def _close_retired(self):
+        with self._lock:
+            retired = self._retired_connections
+            self._retired_connections = []
+        for connection in retired:
+            try:
+                connection.close()
+                logging.debug("Da dong ket noi cu sau khi xoay vong credentials.")
+            except Error as e:
+                logging.warning(f"Loi khi dong ket noi cu: {e}")
 
 
-    def execute_sql(self, sql_command: str): 
-        if not self.is_connected():
+    def execute_sql(self, sql_command: str, buffered: bool = False): 
+        if not self.ensure_connected():
             logging.error("chua ket noi, khong the thuc thi.")
             return None
+        if self._retired_connections:
+            self._close_retired()
+        if self._statement_cache:
+            self._statement_cache.drain()
+
+        def _run():
+            # Cursor không buffer: dòng được kéo từ server khi fetch, không nạp hết vào RAM
+            cursor = self.connection.cursor(buffered=buffered)
+            try:
+                cursor.execute(sql_command)
+            except Error:
+                try:
+                    cursor.close()
+                except Error as ce:
+                    logging.warning(f"Loi khi dong cursor sau khi execute loi: {ce}")
+                raise
+            return cursor
 
-        cursor = None 
         try:
-            cursor = self.connection.cursor()
             logging.debug(f"Executing SQL: {sql_command[:100]}...") 
-            cursor.execute(sql_command)
+            self._track_write(sql_command)
+            cursor = self._run_statement(sql_command, _run, method="execute_sql")
             logging.debug("SQL executed successfully.")
             return cursor
         except Error as e:
+            QUERY_ERRORS.inc(method="execute_sql")
             logging.error(f"loi khi thuc thi SQL: '{sql_command[:100]}...': {e}")
+            return None
+        except Exception as e:
+            logging.error(f"loi khong xac dinh khi thuc thi SQL: {e}")
+            return None 
+
+    def execute(self, sql_command: str, params=()):
+        """
+        Thực thi câu SQL có tham số (%s hoặc ?) bằng prepared statement phía
+        server, dùng lại statement đã prepare cho cùng câu SQL. Cursor trả về
+        thuộc cache của kết nối: đọc kết quả nhưng không đóng cursor.
+        """
+        if not self.ensure_connected():
+            logging.error("chua ket noi, khong the thuc thi.")
+            return None
+        if self._retired_connections:
+            self._close_retired()
+
+        def _run():
+            cache = self._statement_cache
+            if cache is None or cache.connection is not self.connection:
+                # Ket noi da doi (xoay vong credentials, ket noi lai): statement cu nam tren ket noi cu, bo cache
+                self._clear_statement_cache()
+                cache = self._statement_cache = PreparedStatementCache(self.connection)
+            return cache.execute(sql_command, params)
+
+        try:
+            logging.debug(f"Executing prepared SQL: {sql_command[:100]}...")
+            self._track_write(sql_command)
+            return self._run_statement(sql_command, _run, method="execute")
+        except Error as e:
+            QUERY_ERRORS.inc(method="execute")
+            logging.error(f"loi khi thuc thi SQL: '{sql_command[:100]}...': {e}")
+            return None
+
+    def _run_statement(self, sql_command: str, run, method: str):
+        """
+        Chạy `run()` trên kết nối hiện tại, phục hồi lỗi tạm thời: lock wait
+        timeout/deadlock được chạy lại sau backoff nếu transaction chưa có
+        thay đổi nào; mất kết nối thì kết nối lại bằng credentials hiện tại
+        và chạy lại nếu lệnh là đọc idempotent. Lỗi khác được ném ra.
+        """
+        keyword = statement_keyword(sql_command)
+        clean = not (self._uncommitted_writes or self._explicit_transaction)
+        retry_on_lost = clean and is_idempotent_read(sql_command)
+        delays = backoff_delays(MYSQL_RETRY_ATTEMPTS)
+        while True:
+            try:
+                with self._io_lock:
+                    start_time = time.perf_counter()
+                    result = run()
+                    QUERY_LATENCY.observe(time.perf_counter() - start_time, method=method)
+                    self.health.mark_active()
+            except Error as e:
+                lost = self.note_error(e)
+                retryable = (lost and retry_on_lost) or (clean and e.errno in LOCK_CONFLICT_ERRNOS)
+                delay = next(delays, None) if retryable else None
+                if delay is None:
+                    raise
+                QUERY_RETRIES.inc(errno=str(e.errno))
+                logging.warning(f"Loi tam thoi ({e.errno}), thu lai sau {delay:.2f}s: {e}")
+                time.sleep(delay)
+                if lost and not self._reconnect():
+                    raise
+                continue
+            self._note_statement(keyword, sql_command)
+            return result
+
+    def _note_statement(self, keyword: str, sql_command: str):
+        if keyword in ENDS_TRANSACTION_KEYWORDS:
+            self._uncommitted_writes = False
+            self._explicit_transaction = keyword in ("BEGIN", "START")
+            if not self._explicit_transaction:
+                self._apply_staged_connection()
+        elif keyword == "USE":
+            # Ghi nho database de chon lai sau khi ket noi lai
+            self._database = use_target(sql_command) or self._database
+        elif keyword not in READ_KEYWORDS:
+            self._uncommitted_writes = True
+
+    def note_error(self, error: Error) -> bool:
+        """Đánh dấu kết nối hỏng nếu `error` là lỗi mất kết nối; trả về True khi đó."""
+        if error.errno in CONNECTION_LOST_ERRNOS:
+            self.health.mark_broken()
+            return True
+        return False
+
+    def ensure_connected(self) -> bool:
+        """Như is_connected(), nhưng kết nối lại (credentials hiện tại) nếu kết nối đã mất."""
+        if self._staged_connection is not None and not (self._uncommitted_writes or self._explicit_transaction):
+            # Transaction tren ket noi cu chi doc (autocommit tat): bo duoc ma khong mat gi
+            self._apply_staged_connection()
+        if self.is_connected():
+            return True
+        return self._reconnect()
+
+    def _reconnect(self) -> bool:
+        """
+        Mở kết nối mới bằng credentials đang dùng (đã cập nhật khi xoay vòng)
+        thay cho kết nối đã mất, chọn lại database hiện tại.
+        """
+        with self._lock:
+            credentials = self._credentials
+            lost_connection = self.connection
+        if credentials is None:
+            return False
+        username, password = credentials
+        if self._uncommitted_writes:
+            logging.error("Mat ket noi khi con thay doi chua commit, server da rollback cac thay doi nay.")
+            self._uncommitted_writes = False
+            self._pending_invalidation.clear()
+        self._explicit_transaction = False
+        if self._apply_staged_connection():
+            # Ket noi cua credentials moi da mo san, khong can mo lai
+            return True
+        logging.warning(f"Mat ket noi MySQL, dang ket noi lai bang user: {username}...")
+        connection = self._open_connection(username, password)
+        if connection is None:
+            DB_RECONNECTS.inc(result="failed")
+            return False
+        if self._database and self._database != self.initial_db:
+            try:
+                connection.database = self._database
+            except Error as e:
+                logging.warning(f"Khong chon lai duoc database {self._database}: {e}")
+        with self._io_lock:
+            with self._lock:
+                replaced = self.connection is lost_connection
+                if replaced:
+                    self.connection = connection
+            if replaced:
+                self._clear_statement_cache()
+                self.health.mark_active()
+        if not replaced:
+            # Ket noi da duoc thay (vd. xoay vong credentials) trong luc dang mo lai
+            try:
+                connection.close()
+            except Error as e:
+                logging.debug(f"Loi khi dong ket noi thua: {e}")
+            return True
+        if lost_connection is not None:
+            try:
+                lost_connection.close()
+            except Error as e:
+                logging.debug(f"Loi khi dong ket noi da mat: {e}")
+        DB_RECONNECTS.inc(result="ok")
+        logging.info(f"-> da ket noi lai bang user: {username}")
+        return True
+
+    def _keepalive_ping(self):
+        connection = self.connection
+        if connection is None or not self._io_lock.acquire(blocking=False):
+            return
+        try:
+            # Cursor khong buffer dang doc do: ket noi dang duoc dung, khong ping
+            if self.health.broken or connection.unread_result:
+                return
+            connection.ping(reconnect=False)
+            self.health.mark_active()
+            DB_KEEPALIVE_PINGS.inc(result="ok")
+        except Error as e:
+            self.health.mark_broken()
+            DB_KEEPALIVE_PINGS.inc(result="failed")
+            logging.warning(f"Keepalive: ket noi MySQL khong phan hoi, se ket noi lai o lenh tiep theo: {e}")
+        finally:
+            self._io_lock.release()
+
+    def enable_result_cache(self, max_bytes: int, default_ttl: float):
+        """Bật cache kết quả đọc cho query_cached()."""
+        self.result_cache = QueryResultCache(max_bytes=max_bytes, default_ttl=default_ttl)
+        logging.info(f"Da bat cache ket qua ({max_bytes} byte, TTL {default_ttl}s).")
+
+    def query_cached(self, sql_command: str, params=(), ttl: float | None = None) -> tuple | None:
+        """
+        Đọc qua cache: trả về (columns, rows) từ cache nếu còn hạn, nếu không
+        thì chạy truy vấn, lưu kết quả và trả về. Câu lệnh không xác định
+        (NOW(), RAND(), biến @...) hoặc không phải SELECT luôn chạy trực tiếp.
+        """
+        cache = self.result_cache
+        cacheable = cache is not None and is_cacheable(sql_command)
+        if cacheable:
+            key = cache.make_key(sql_command, params, self._database)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            generation = cache.generation
+
+        if params:
+            cursor = self.execute(sql_command, params)
+        else:
+            cursor = self.execute_sql(sql_command, buffered=True)
+        if not cursor:
+            return None
+        try:
+            columns = [col[0] for col in cursor.description] if cursor.description else []
+            rows = cursor.fetchall() if cursor.description else []
+        except Error as e:
+            logging.error(f"loi khi doc ket qua: {e}")
+            return None
+        finally:
+            # Cursor prepared thuoc statement cache, khong dong
+            if not params:
+                cursor.close()
+
+        if cacheable and columns:
+            cache.put(key, columns, rows, referenced_tables(sql_command), ttl=ttl, generation=generation)
+        return columns, rows
+
+    def stream_cached(self, sql_command: str, max_rows: int = 0, batch_size: int = SQL_FETCH_BATCH_SIZE,
+                      ttl: float | None = None) -> tuple | None:
+        """
+        Như query_cached nhưng trả về (columns, các lô dòng) để hiển thị dạng
+        stream. Khi cache trượt, các lô được giữ lại để lưu cache chỉ tới khi
+        ước tính vượt max_bytes của cache; sau đó phần còn lại được stream
+        thẳng từ cursor không buffer và không lưu. Kết quả bị cắt ở
+        `max_rows` cũng không được lưu.
+        """
+        cache = self.result_cache
+        cacheable = cache is not None and is_cacheable(sql_command)
+        if cacheable:
+            key = cache.make_key(sql_command, (), self._database)
+            cached = cache.get(key)
+            if cached is not None:
+                columns, rows = cached
+                return columns, iter([rows[:max_rows] if max_rows else rows])
+            generation = cache.generation
+
+        cursor = self.execute_sql(sql_command)
+        if not cursor:
+            return None
+        if not cursor.description:
+            cursor.close()
+            return [], iter(())
+
+        columns = [col[0] for col in cursor.description]
+
+        def _batches():
+            kept = [] if cacheable else None
+            kept_bytes = 0
+            row_count = 0
+            try:
+                for rows in iter_batches(cursor, batch_size, max_rows):
+                    row_count += len(rows)
+                    if kept is not None:
+                        kept.append(rows)
+                        kept_bytes += estimate_row_bytes(rows[0]) * len(rows)
+                        if kept_bytes > cache.max_bytes:
+                            # Qua lon de cache: bo phan da giu, stream tiep
+                            kept = None
+                    yield rows
+                if kept is not None and not (max_rows and row_count >= max_rows):
+                    rows = [row for batch in kept for row in batch]
+                    cache.put(key, columns, rows, referenced_tables(sql_command), ttl=ttl, generation=generation)
+            finally:
+                # Dung o max_rows hoac nguoi dung dong pager: dung cau lenh thay vi doc het
+                self.cancel_unread_result()
+                try:
+                    cursor.close()
+                except Error as e:
+                    logging.warning(f"Loi khi dong cursor: {e}")
+
+        return columns, _batches()
+
+    def _track_write(self, sql_command: str, script: bool = False):
+        if self.result_cache is None:
+            return
+        kind, tables = classify_script(sql_command) if script else classify_write(sql_command)
+        if kind is None:
+            return
+        # Khong nhan ra bang nao thi huy toan bo cache cho chac
+        self._pending_invalidation.update(tables or {"*"})
+        if kind == "ddl":
+            # DDL tu commit ngay (ca cac lenh DML dang cho)
+            self._apply_invalidation()
+
+    def _apply_invalidation(self):
+        pending = self._pending_invalidation
+        self._pending_invalidation = set()
+        if not pending or self.result_cache is None:
+            return
+        if "*" in pending:
+            self.result_cache.clear()
+        else:
+            self.result_cache.invalidate_tables(pending)
+
+    def _clear_statement_cache(self):
+        cache = self._statement_cache
+        self._statement_cache = None
+        if cache:
+            # Ket noi cua cache se bi dong, server tu giai phong cac statement
+            cache.clear(release=False)
+
+    def execute_many(self, sql_command: str, rows: list) -> int | None:
+        """
+        Chạy một lệnh INSERT với nhiều bộ tham số. mysql.connector gộp chúng
+        thành một lệnh INSERT nhiều dòng, nên cả lô chỉ tốn một round trip.
+        """
+        if self.connection is None:
+            logging.error("chua ket noi, khong the thuc thi.")
+            return None
+
+        cursor = None
+        try:
+            cursor = self.connection.cursor()
+            self._track_write(sql_command)
+            with self._io_lock:
+                start_time = time.perf_counter()
+                cursor.executemany(sql_command, rows)
+                QUERY_LATENCY.observe(time.perf_counter() - start_time, method="execute_many")
+                self.health.mark_active()
+            self._uncommitted_writes = True
+            return cursor.rowcount
+        except Error as e:
+            self.note_error(e)
+            QUERY_ERRORS.inc(method="execute_many")
+            logging.error(f"loi khi thuc thi executemany: '{sql_command[:100]}...': {e}")
+            return None
+        finally:
             if cursor:
                 try:
                     cursor.close()
                 except Error as ce:
-                    logging.warning(f"Loi khi dong cursor sau khi execute loi: {ce}")
-            return None
-        except Exception as e:
-            logging.error(f"loi khong xac dinh khi thuc thi SQL: {e}")
+                    logging.warning(f"Loi khi dong cursor sau executemany: {ce}")
+
+    def execute_script(self, sql_script: str, on_result=None) -> bool:
+        """
+        Gửi nhiều lệnh (ngăn cách bởi ';') trong một round trip. Với mỗi lệnh
+        trả về dữ liệu, gọi `on_result(cursor)` để đọc hết các dòng (mặc định
+        bỏ qua). Không tự commit.
+        """
+        if not self.ensure_connected():
+            logging.error("chua ket noi, khong the thuc thi.")
+            return False
+        if self._retired_connections:
+            self._close_retired()
+
+        cursor = None
+        try:
+            cursor = self.connection.cursor()
+            self._track_write(sql_script, script=True)
+            with self._io_lock:
+                start_time = time.perf_counter()
+                try:
+                    results = cursor.execute(sql_script, multi=True)
+                except TypeError:
+                    # mysql-connector >= 9.2 bo tham so multi, cac result set doc bang nextset()
+                    cursor.execute(sql_script)
+                    results = self._iter_result_sets(cursor)
+                for result in results:
+                    if result.with_rows:
+                        if on_result:
+                            on_result(result)
+                        else:
+                            result.fetchall()
+                QUERY_LATENCY.observe(time.perf_counter() - start_time, method="execute_script")
+                self.health.mark_active()
+            self._uncommitted_writes = True
+            return True
+        except Error as e:
+            self.note_error(e)
+            QUERY_ERRORS.inc(method="execute_script")
+            logging.error(f"loi khi thuc thi script SQL: '{sql_script[:100]}...': {e}")
+            return False
+        finally:
             if cursor:
                 try:
                     cursor.close()
                 except Error as ce:
-                    logging.warning(f"Loi khi dong cursor sau loi khong xac dinh: {ce}")
-            return None 
+                    logging.warning(f"Loi khi dong cursor sau khi thuc thi script: {ce}")
+
+    def kill_query(self, connection_id: int) -> bool:
+        """
+        Gửi KILL QUERY cho một kết nối (trong pool hoặc kết nối chính) qua một
+        kết nối điều khiển riêng, để không phải chờ slot trống trong pool khi
+        pool đang bận hay chờ kết nối đang stream kết quả.
+        """
+        with self._control_lock:
+            try:
+                if self._control_connection is None:
+                    if self.pool:
+                        self._control_connection = self.pool.open_unpooled()
+                    elif self._credentials:
+                        self._control_connection = self._open_connection(*self._credentials)
+                if self._control_connection is None:
+                    logging.error("Khong mo duoc ket noi dieu khien de KILL QUERY.")
+                    return False
+                cursor = self._control_connection.cursor()
+                try:
+                    cursor.execute(f"KILL QUERY {int(connection_id)}")
+                finally:
+                    cursor.close()
+                logging.info(f"Da gui KILL QUERY cho ket noi {connection_id}.")
+                return True
+            except Error as e:
+                logging.error(f"Loi khi KILL QUERY {connection_id}: {e}")
+                # Ket noi dieu khien co the da hong, lan sau mo lai
+                self._close_control_connection_locked()
+                return False
+
+    def cancel_unread_result(self) -> bool:
+        """
+        Dừng câu lệnh đang stream kết quả trên kết nối chính (vd. khi chạm
+        giới hạn dòng) bằng KILL QUERY, rồi chỉ đọc bỏ phần dòng đã trên
+        đường truyền. discard_unread_result() một mình sẽ kéo hết các dòng
+        còn lại về, nên \\limit không giới hạn được thời gian chờ. Trả về
+        False nếu không gửi được KILL (khi đó vẫn đọc bỏ toàn bộ phần còn lại).
+        """
+        connection = self.connection
+        if connection is None or not connection.unread_result:
+            return True
+        killed = self.kill_query(connection.connection_id)
+        self.discard_unread_result()
+        return killed
+
+    def cancel_pooled_result(self, connection) -> bool:
+        """
+        Như cancel_unread_result() nhưng cho một kết nối mượn từ pool: KILL
+        QUERY rồi đọc bỏ phần dòng đã trên đường truyền, để đóng cursor không
+        báo "Unread result found". Trả về False nếu kết nối không còn dùng
+        lại được (caller nên bỏ nó khỏi pool).
+        """
+        if not connection.unread_result:
+            return True
+        self.kill_query(connection.connection_id)
+        try:
+            connection.consume_results()
+        except Error as e:
+            if e.errno != _ER_QUERY_INTERRUPTED:
+                logging.warning(f"Loi khi bo qua ket qua chua doc tren ket noi {connection.connection_id}: {e}")
+                return False
+            logging.debug(f"Cau lenh da bi dung: {e}")
+        return True
+
+    def _close_control_connection(self):
+        with self._control_lock:
+            self._close_control_connection_locked()
+
+    def _close_control_connection_locked(self):
+        if self._control_connection is not None:
+            try:
+                self._control_connection.close()
+            except Error as e:
+                logging.debug(f"Loi khi dong ket noi dieu khien: {e}")
+            self._control_connection = None
+
+    @staticmethod
+    def _iter_result_sets(cursor):
+        yield cursor
+        while cursor.nextset():
+            yield cursor
+
+    def discard_unread_result(self):
+        """
+        Bỏ phần kết quả chưa đọc của cursor không buffer (vd. khi dừng ở giới
+        hạn dòng), để kết nối sẵn sàng cho lệnh tiếp theo.
+        """
+        with self._lock:
+            connections = [self.connection, *self._retired_connections]
+        for connection in connections:
+            if connection is None:
+                continue
+            try:
+                if connection.unread_result:
+                    connection.consume_results()
+            except Error as e:
+                if e.errno == _ER_QUERY_INTERRUPTED:
+                    # Ket qua bi dung boi cancel_unread_result(), ket noi van dung duoc
+                    logging.debug(f"Cau lenh da bi dung: {e}")
+                    continue
+                if connection is self.connection:
+                    self.note_error(e)
+                logging.warning(f"Loi khi bo qua ket qua chua doc: {e}")
+        # Doc xong ket qua cung la dau hieu ket noi con song
+        if not self.health.broken:
+            self.health.mark_active()
 
     def commit(self):
         if self.is_connected():
             try:
-                self.connection.commit()
+                with self._io_lock:
+                    self.connection.commit()
+                    self.health.mark_active()
+                self._uncommitted_writes = False
+                self._explicit_transaction = False
                 logging.debug("Transaction committed.")
+                self._apply_invalidation()
             except Error as e:
+                self.note_error(e)
                 logging.error(f"loi khi commit transaction: {e}")
+            self._apply_staged_connection()
 
     def rollback(self):
         if self.is_connected():
             try:
-                self.connection.rollback()
+                with self._io_lock:
+                    self.connection.rollback()
+                    self.health.mark_active()
+                self._uncommitted_writes = False
+                self._explicit_transaction = False
                 logging.info("transaction rollback.")
+                self._pending_invalidation.clear()
             except Error as e:
+                self.note_error(e)
                 logging.error(f"loi khi rollback: {e}")
+            self._apply_staged_connection()
 
     def close(self):
-        if self.connection and self.connection.is_connected():
+        self.health.stop_keepalive()
+        with self._lock:
+            self._credentials = None
+            if self._staged_connection is not None:
+                self._retired_connections.append(self._staged_connection[0])
+                self._staged_connection = None
+        self._clear_statement_cache()
+        self._close_retired()
+        self._close_control_connection()
+        if self.pool:
+            self.pool.close()
+        # Khong ping truoc (is_connected): ket noi da mat van phai duoc dong va bo tham chieu
+        if self.connection is not None:
             try:
                 dynamic_user_copy = self.dynamic_user
                 self.connection.close()
                 logging.info(f"dong dong ket noi user: {dynamic_user_copy}.")
-                self.connection = None
-                self.dynamic_user = None
             except Error as e:
                 logging.error(f"khong the dong ket noi {e}")
+            self.connection = None
+            self.dynamic_user = None
+            self.lease_id = None
 
 
 
     def is_connected(self) -> bool:
-        return self.connection is not None and self.connection.is_connected()
\ No newline at end of file
+        """
+        Kiểm tra rẻ: kết nối vừa hoạt động trong MYSQL_HEALTH_TRUST_SECONDS
+        (keepalive giữ mốc này khi rảnh) được tin mà không cần round trip;
+        quá mốc đó mới ping server.
+        """
+        connection = self.connection
+        if connection is None or self.health.broken:
+            return False
+        if self.health.is_trusted() or connection.unread_result:
+            return True
+        with self._io_lock:
+            alive = connection.is_connected()
+        if alive:
+            self.health.mark_active()
+        else:
+            self.health.mark_broken()
+        return alive
@@ -0,0 +1,131 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeVaultServer:
+    """
+    Vault giả lập cho benchmark: phục vụ auth/token/lookup-self,
+    database/creds/<role>, sys/leases/renew và sys/leases/revoke. Mọi role
+    trả về cùng một user MySQL tĩnh; `latency` (giây) mô phỏng độ trễ mạng
+    và thời gian Vault tạo user động.
+    """
+
+    def __init__(self, mysql_user: str, mysql_password: str, lease_duration: int = 3600,
+                 max_ttl: int = 86400, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.mysql_user = mysql_user
+        self.mysql_password = mysql_password
+        self.lease_duration = lease_duration
+        self.max_ttl = max_ttl
+        self.latency = latency
+        self._lock = threading.Lock()
+        # lease_id -> thoi diem het max TTL
+        self.leases = {}
+        self.request_counts = {}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeVaultServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FakeVault", daemon=True)
+        self._thread.start()
+        logging.info(f"Fake Vault dang chay tai {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, operation: str):
+        with self._lock:
+            self.request_counts[operation] = self.request_counts.get(operation, 0) + 1
+
+    def _issue_creds(self, role: str) -> dict:
+        lease_id = f"database/creds/{role}/{uuid.uuid4().hex}"
+        with self._lock:
+            self.leases[lease_id] = time.monotonic() + self.max_ttl
+        return {
+            "request_id": uuid.uuid4().hex,
+            "lease_id": lease_id,
+            "lease_duration": min(self.lease_duration, self.max_ttl),
+            "renewable": True,
+            "data": {"username": self.mysql_user, "password": self.mysql_password},
+        }
+
+    def _renew(self, lease_id: str, increment: int | None) -> dict | None:
+        with self._lock:
+            max_expiry = self.leases.get(lease_id)
+        if max_expiry is None:
+            return None
+        remaining = max(0, int(max_expiry - time.monotonic()))
+        return {
+            "lease_id": lease_id,
+            "lease_duration": min(increment or self.lease_duration, remaining),
+            "renewable": remaining > 0,
+        }
+
+    def _revoke(self, lease_id: str) -> bool:
+        with self._lock:
+            return self.leases.pop(lease_id, None) is not None
+
+    def _make_handler(self):
+        vault = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._dispatch()
+
+            def do_POST(self):
+                self._dispatch()
+
+            def do_PUT(self):
+                self._dispatch()
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                path = self.path.split("?", 1)[0]
+                if vault.latency:
+                    time.sleep(vault.latency)
+
+                if path == "/v1/auth/token/lookup-self":
+                    vault._count("lookup_self")
+                    self._reply(200, {"data": {"id": "bench-token", "policies": ["root"], "ttl": 0}})
+                elif path.startswith("/v1/database/creds/"):
+                    vault._count("generate_credentials")
+                    self._reply(200, vault._issue_creds(path.rsplit("/", 1)[-1]))
+                elif path == "/v1/sys/leases/renew":
+                    vault._count("renew_lease")
+                    renewed = vault._renew(body.get("lease_id"), body.get("increment"))
+                    if renewed is None:
+                        self._reply(400, {"errors": ["lease not found"]})
+                    else:
+                        self._reply(200, renewed)
+                elif path == "/v1/sys/leases/revoke":
+                    vault._count("revoke_lease")
+                    vault._revoke(body.get("lease_id"))
+                    self._reply(204, None)
+                else:
+                    self._reply(404, {"errors": [f"no handler for route '{path}'"]})
+
+            def _reply(self, status: int, payload):
+                data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"fake vault: {format % args}")
+
+        return _Handler
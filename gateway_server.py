@@ -0,0 +1,306 @@
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import SQL_FETCH_BATCH_SIZE, GATEWAY_SESSION_TTL_SECONDS, GATEWAY_MAX_ROWS, GATEWAY_TOKEN
+from db_manager import DatabaseManager
+from mysql.connector import Error
+from result_stream import iter_batches
+from result_export import json_default
+from query_cache import statement_keyword, classify_write, use_target
+from metrics import QUERY_LATENCY, QUERY_ERRORS
+
+
+_BEGIN_KEYWORDS = {"BEGIN", "START"}
+_END_KEYWORDS = {"COMMIT", "ROLLBACK"}
+
+
+class GatewaySession:
+    """
+    Trạng thái logic của một client. Không giữ kết nối riêng: chỉ khi mở
+    transaction (BEGIN/START TRANSACTION) phiên mới được gắn một kết nối
+    của pool cho tới COMMIT/ROLLBACK.
+    """
+
+    def __init__(self, database: str | None = None):
+        self.id = uuid.uuid4().hex
+        self.database = database
+        self.pinned = None
+        self.pending_tables = set()
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class QueryGateway:
+    """
+    Chế độ server: nhận SQL qua HTTP và trả kết quả dạng NDJSON theo từng
+    lô. Mọi phiên dùng chung pool kết nối (và lease Vault) của
+    `db_manager`, nên mỗi request chỉ tốn thời gian chạy truy vấn.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, max_rows: int = GATEWAY_MAX_ROWS,
+                 session_ttl: float = GATEWAY_SESSION_TTL_SECONDS, token: str | None = GATEWAY_TOKEN):
+        if not db_manager.pool:
+            raise ValueError("QueryGateway can DatabaseManager o che do pool (pool_size > 0).")
+        self.db_manager = db_manager
+        self.max_rows = max_rows
+        self.session_ttl = session_ttl
+        self.token = token
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.server = None
+
+    # ---------- phien ----------
+
+    def create_session(self, database: str | None = None) -> GatewaySession:
+        session = GatewaySession(database)
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id: str) -> GatewaySession | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session:
+            session.last_used = time.monotonic()
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        with session.lock:
+            self._unpin(session, discard=False)
+        return True
+
+    def expire_sessions(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if now - s.last_used > self.session_ttl]
+        for session_id in expired:
+            logging.info(f"Phien gateway {session_id[:8]} het han, tra ket noi ve pool.")
+            self.close_session(session_id)
+
+    def close_sessions(self):
+        with self._lock:
+            session_ids = list(self._sessions)
+        for session_id in session_ids:
+            self.close_session(session_id)
+
+    def _unpin(self, session: GatewaySession, discard: bool):
+        if session.pinned is not None:
+            # checkin() rollback transaction con mo
+            self.db_manager.pool.checkin(session.pinned, discard=discard)
+            session.pinned = None
+        session.pending_tables.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "in_transaction": sum(1 for s in sessions if s.pinned is not None),
+            "pool": self.db_manager.pool.stats(),
+            "user": self.db_manager.dynamic_user,
+        }
+
+    # ---------- thuc thi ----------
+
+    def run_query(self, request: dict, session: GatewaySession | None, emit):
+        """
+        Chạy một câu SQL và gọi `emit(dict)` cho từng dòng NDJSON: header
+        {"columns"}, các lô {"rows"}, cuối cùng {"done"}; lệnh không trả dòng
+        thì {"rowcount"}; lỗi thì {"error"}.
+        """
+        sql_command = request.get("sql", "").strip()
+        params = request.get("params") or ()
+        max_rows = request.get("max_rows") or self.max_rows
+        if self.max_rows:
+            max_rows = min(max_rows, self.max_rows)
+        keyword = statement_keyword(sql_command)
+        write_kind, write_tables = classify_write(sql_command)
+
+        pooled = session.pinned if session else None
+        borrowed = pooled is None
+        if borrowed:
+            pooled = self.db_manager.pool.checkout()
+            if pooled is None:
+                emit({"error": "Khong lay duoc ket noi tu pool."})
+                return
+            if session and keyword in _BEGIN_KEYWORDS:
+                session.pinned = pooled
+                borrowed = False
+        database = request.get("database") or (session.database if session else None)
+
+        start_time = time.perf_counter()
+        discard = False
+        cursor = None
+        try:
+            # Schema dang chon duoc theo doi tren PooledConnection: chi gui USE khi khac,
+            # pool dat lai (hoac bo ket noi) khi ket noi duoc tra ve
+            pooled.use_database(database)
+            if params:
+                cursor = pooled.execute(sql_command, params)
+            else:
+                cursor = pooled.cursor()
+                cursor.execute(sql_command)
+            QUERY_LATENCY.observe(time.perf_counter() - start_time, method="gateway")
+
+            if cursor.description:
+                emit({"columns": [col[0] for col in cursor.description]})
+                row_count = 0
+                for rows in iter_batches(cursor, SQL_FETCH_BATCH_SIZE, max_rows):
+                    row_count += len(rows)
+                    emit({"rows": rows})
+                # Cham max_rows: KILL phan con lai, chi doc bo cac dong dang tren duong truyen
+                if not self.db_manager.cancel_pooled_result(pooled.connection):
+                    discard = True
+                emit({"done": True, "row_count": row_count, "truncated": bool(max_rows) and row_count >= max_rows,
+                      "elapsed": time.perf_counter() - start_time})
+            else:
+                rowcount = cursor.rowcount
+                self._finish_write(session, pooled, keyword, write_kind, write_tables)
+                emit({"rowcount": rowcount, "elapsed": time.perf_counter() - start_time})
+
+            if keyword == "USE":
+                pooled.database = use_target(sql_command)
+                if session:
+                    session.database = pooled.database
+        except Error as e:
+            QUERY_ERRORS.inc(method="gateway")
+            logging.warning(f"Gateway: loi khi thuc thi '{sql_command[:100]}': {e}")
+            discard = not pooled.connection.is_connected()
+            emit({"error": str(e), "errno": e.errno})
+        finally:
+            if cursor is not None and not params:
+                try:
+                    cursor.close()
+                except Error:
+                    discard = True
+            if borrowed:
+                self.db_manager.pool.checkin(pooled, discard=discard)
+            elif discard and session:
+                self._unpin(session, discard=True)
+
+    def _finish_write(self, session: GatewaySession | None, pooled, keyword: str, write_kind, write_tables):
+        cache = self.db_manager.result_cache
+        in_session_tx = session is not None and session.pinned is pooled
+        if keyword in _END_KEYWORDS and in_session_tx:
+            if keyword == "COMMIT" and cache and session.pending_tables:
+                cache.invalidate_tables(session.pending_tables)
+            self._unpin(session, discard=False)
+            return
+        if in_session_tx:
+            if write_kind:
+                session.pending_tables |= write_tables
+            return
+        # Lenh ngoai transaction cua phien: moi request la mot transaction rieng
+        pooled.commit()
+        if cache and write_kind:
+            cache.invalidate_tables(write_tables)
+
+    # ---------- HTTP ----------
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        gateway = self
+
+        class _Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                if self.path == "/health":
+                    self._reply(200, {"status": "ok", **gateway.stats()})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if not self._authorized():
+                    return
+                gateway.expire_sessions()
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "Body phai la JSON."})
+                    return
+                if self.path == "/sessions":
+                    session = gateway.create_session(body.get("database"))
+                    self._reply(201, {"session": session.id})
+                elif self.path == "/query":
+                    self._query(body)
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_DELETE(self):
+                if not self._authorized():
+                    return
+                if self.path.startswith("/sessions/") and gateway.close_session(self.path.rsplit("/", 1)[-1]):
+                    self._reply(200, {"closed": True})
+                else:
+                    self._reply(404, {"error": "session not found"})
+
+            def _query(self, body: dict):
+                if not body.get("sql"):
+                    self._reply(400, {"error": "Thieu truong 'sql'."})
+                    return
+                session = None
+                if body.get("session"):
+                    session = gateway.get_session(body["session"])
+                    if session is None:
+                        self._reply(404, {"error": "session not found"})
+                        return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                encode = json.JSONEncoder(ensure_ascii=False, default=json_default).encode
+
+                def emit(message: dict):
+                    self.wfile.write((encode(message) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+                try:
+                    if session:
+                        # Cac request cua cung mot phien chay tuan tu
+                        with session.lock:
+                            gateway.run_query(body, session, emit)
+                    else:
+                        gateway.run_query(body, None, emit)
+                except (BrokenPipeError, ConnectionResetError):
+                    logging.info("Gateway: client ngat ket noi truoc khi nhan het ket qua.")
+
+            def _authorized(self) -> bool:
+                if not gateway.token:
+                    return True
+                supplied = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+                if hmac.compare_digest(supplied, gateway.token):
+                    return True
+                self._reply(401, {"error": "unauthorized"})
+                return False
+
+            def _reply(self, status: int, payload: dict):
+                data = json.dumps(payload, default=json_default).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"gateway http: {format % args}")
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        logging.info(f"Gateway SQL phuc vu tai http://{host}:{self.server.server_address[1]} (POST /query, /sessions)")
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.close_sessions()
@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import (
+    DEFAULT_LEASE_DURATION_WARNING_SECONDS, LEASE_RENEW_THRESHOLD_RATIO,
+    LEASE_RENEW_INCREMENT_SECONDS, LEASE_RETRY_INTERVAL_SECONDS,
+    LEASE_SCHEDULER_WORKERS, LEASE_REVOKE_TIMEOUT_SECONDS
+)
+from metrics import LEASE_REMAINING
+
+# So thu tu cua handle, dung lam nhan metrics: khong doi khi lease xoay vong nhu lease_id
+_handle_numbers = itertools.count(1)
+
+
+class LeaseHandle:
+    """
+    Một lease do LeaseScheduler quản lý. Không có luồng riêng: scheduler gọi
+    _tick() trên worker pool khi tới hạn, handle tự tính lần chạy kế tiếp.
+    """
+
+    def __init__(self, scheduler: "LeaseScheduler", role_name: str, creds: dict, on_rotate):
+        self.scheduler = scheduler
+        self.vault_client = scheduler.vault_client
+        self.role_name = role_name
+        self.on_rotate = on_rotate
+        self.buffer_seconds = DEFAULT_LEASE_DURATION_WARNING_SECONDS if DEFAULT_LEASE_DURATION_WARNING_SECONDS > 0 else 10
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.number = next(_handle_numbers)
+        # So thu tu cua entry hop le trong heap; entry cu (seq khac) bi bo qua
+        self._seq = None
+        self._set_lease(creds)
+
+    @property
+    def lease_id(self) -> str:
+        with self.lock:
+            return self._lease_id
+
+    @property
+    def next_run_at(self) -> float:
+        with self.lock:
+            return self._next_run_at
+
+    def time_remaining(self) -> float:
+        with self.lock:
+            return self._expires_at - time.monotonic()
+
+    def stop(self, timeout: float | None = 5) -> str:
+        """Ngừng theo dõi lease (phiên kết thúc bình thường), trả về lease ID hiện tại để caller revoke."""
+        return self.scheduler.cancel(self, timeout)
+
+    def _set_lease(self, lease: dict):
+        with self.lock:
+            self._lease_id = lease['lease_id']
+            self._lease_duration = lease['lease_duration']
+            self.increment = LEASE_RENEW_INCREMENT_SECONDS or lease['lease_duration']
+            self._renewable = lease.get('renewable', False)
+            self._expires_at = time.monotonic() + lease['lease_duration']
+            # Lease mới không gia hạn được thì phải xoay vòng trước khi hết hạn
+            self._needs_rotation = not self._renewable
+            self._next_run_at = self._schedule_next()
+
+    def _schedule_next(self) -> float:
+        now = time.monotonic()
+        remaining = self._expires_at - now
+        if self._needs_rotation:
+            return now + max(0, remaining - self.buffer_seconds)
+        renew_lead = max(self.buffer_seconds, self._lease_duration * (1 - LEASE_RENEW_THRESHOLD_RATIO))
+        return now + max(0, remaining - renew_lead)
+
+    def _tick(self):
+        with self.lock:
+            lease_id = self._lease_id
+            needs_rotation = self._needs_rotation
+
+        if not needs_rotation:
+            renewed = self.vault_client.renew_lease(lease_id, increment=self.increment)
+            if renewed:
+                with self.lock:
+                    self._lease_duration = renewed['lease_duration']
+                    self._expires_at = time.monotonic() + renewed['lease_duration']
+                    # Vault cắt ngắn thời hạn khi chạm max TTL -> lần sau phải xoay vòng
+                    if renewed['lease_duration'] < self.increment:
+                        self._needs_rotation = True
+                        logging.info(f"[Lease-{lease_id[:8]}] Lease sap cham max TTL ({renewed['lease_duration']}s con lai), se xoay vong credentials.")
+                    self._next_run_at = self._schedule_next()
+                return
+            logging.warning(f"[Lease-{lease_id[:8]}] Khong the renew lease, chuyen sang xoay vong credentials.")
+
+        self._rotate(lease_id)
+
+    def _rotate(self, old_lease_id: str):
+        new_creds = self.vault_client.acquire_db_credentials(self.role_name)
+        if not new_creds:
+            logging.error(f"[Lease-{old_lease_id[:8]}] Khong lay duoc credentials moi, se thu lai.")
+            self._retry_later()
+            return
+
+        try:
+            swapped = self.on_rotate(new_creds)
+        except Exception as e:
+            logging.error(f"[Lease-{old_lease_id[:8]}] Loi khi chuyen sang credentials moi: {e}")
+            swapped = False
+        if not swapped:
+            logging.error(f"[Lease-{old_lease_id[:8]}] Khong chuyen duoc sang credentials moi, revoke lease moi va thu lai.")
+            self.vault_client.revoke_lease(new_creds['lease_id'])
+            self._retry_later()
+            return
+
+        self._set_lease(new_creds)
+        logging.info(f"[Lease-{old_lease_id[:8]}] Da xoay vong sang lease {new_creds['lease_id'][:8]}... (user: {new_creds['username']})")
+        self.vault_client.revoke_lease(old_lease_id)
+
+    def _retry_later(self):
+        with self.lock:
+            self._next_run_at = time.monotonic() + LEASE_RETRY_INTERVAL_SECONDS
+            if self._expires_at - time.monotonic() <= self.buffer_seconds:
+                # Không còn đủ thời gian để renew, lần thử tiếp theo là xoay vòng
+                self._needs_rotation = True
+
+
+class LeaseScheduler:
+    """
+    Theo dõi số lượng lease bất kỳ bằng một heap sắp theo thời điểm cần xử
+    lý và một luồng điều phối duy nhất; renew/xoay vòng/revoke chạy trên
+    worker pool nhỏ nên một lease chậm không chặn các lease khác.
+    """
+
+    def __init__(self, vault_client, max_workers: int = LEASE_SCHEDULER_WORKERS):
+        self.vault_client = vault_client
+        self._cond = threading.Condition()
+        # (thoi diem chay, seq, handle)
+        self._heap = []
+        self._counter = itertools.count()
+        self._handles = set()
+        self._running = set()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="LeaseWorker")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="LeaseScheduler", daemon=True)
+        self._dispatcher.start()
+
+    def schedule(self, role_name: str, creds: dict, on_rotate) -> LeaseHandle:
+        """
+        Bắt đầu tự động gia hạn lease của `creds`. Khi lease không thể gia hạn
+        thêm, lấy credentials mới cho `role_name` và gọi `on_rotate(new_creds)`;
+        callback trả về True nếu đã chuyển sang credentials mới, khi đó lease
+        cũ sẽ bị revoke.
+        """
+        handle = LeaseHandle(self, role_name, creds, on_rotate)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("LeaseScheduler da dung, khong the them lease.")
+            self._handles.add(handle)
+            self._push(handle)
+        # Moi lease mot nhan rieng: nhieu lease cung role khong ghi de (hay xoa) gauge cua nhau
+        LEASE_REMAINING.set_function(handle.time_remaining, role=role_name, lease=str(handle.number))
+        logging.info(f"[Lease-{handle.lease_id[:8]}] Bat dau tu dong gia han lease (increment: {handle.increment}s)")
+        return handle
+
+    def cancel(self, handle: LeaseHandle, timeout: float | None = 5) -> str:
+        """Bỏ lease khỏi lịch, chờ thao tác đang chạy của nó (nếu có) xong rồi trả về lease ID hiện tại."""
+        with self._cond:
+            handle.cancelled = True
+            self._handles.discard(handle)
+            if threading.current_thread().name.startswith("LeaseWorker"):
+                timeout = 0
+            self._cond.wait_for(lambda: handle not in self._running, timeout)
+        LEASE_REMAINING.remove(role=handle.role_name, lease=str(handle.number))
+        return handle.lease_id
+
+    def _push(self, handle: LeaseHandle):
+        handle._seq = next(self._counter)
+        heapq.heappush(self._heap, (handle.next_run_at, handle._seq, handle))
+        self._cond.notify_all()
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                run_at, seq, handle = self._heap[0]
+                delay = run_at - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if handle.cancelled or seq != handle._seq:
+                    continue
+                self._running.add(handle)
+                self._executor.submit(self._run_job, handle)
+
+    def _run_job(self, handle: LeaseHandle):
+        try:
+            handle._tick()
+        except Exception as e:
+            logging.error(f"[Lease-{handle.lease_id[:8]}] Loi khong mong doi khi gia han: {e}", exc_info=True)
+            handle._retry_later()
+        finally:
+            with self._cond:
+                self._running.discard(handle)
+                if not handle.cancelled and not self._stopped:
+                    self._push(handle)
+                self._cond.notify_all()
+
+    def lease_ids(self) -> list:
+        with self._cond:
+            return [handle.lease_id for handle in self._handles]
+
+    def stop(self, timeout: float | None = 5) -> list:
+        """
+        Dừng điều phối, chờ các thao tác đang chạy xong và trả về lease ID
+        hiện tại của mọi lease còn theo dõi (đã xoay vòng thì là lease mới).
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._running, timeout)
+            handles = list(self._handles)
+            self._handles.clear()
+            self._heap.clear()
+            for handle in handles:
+                handle.cancelled = True
+        self._dispatcher.join(timeout)
+        for handle in handles:
+            LEASE_REMAINING.remove(role=handle.role_name, lease=str(handle.number))
+        return [handle.lease_id for handle in handles]
+
+    def revoke_leases(self, lease_ids: list, timeout: float | None = LEASE_REVOKE_TIMEOUT_SECONDS) -> int:
+        """Revoke đồng thời các lease trên worker pool, trả về số yêu cầu đã hoàn tất trong `timeout`."""
+        lease_ids = [lease_id for lease_id in lease_ids if lease_id]
+        if not lease_ids:
+            return 0
+        futures = [self._executor.submit(self.vault_client.revoke_lease, lease_id) for lease_id in lease_ids]
+        done, not_done = wait(futures, timeout)
+        if not_done:
+            logging.warning(f"{len(not_done)}/{len(lease_ids)} yeu cau revoke chua xong sau {timeout}s.")
+        logging.info(f"Da gui revoke cho {len(done)} lease.")
+        return len(done)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def shutdown(self, revoke: bool = True, timeout: float | None = LEASE_REVOKE_TIMEOUT_SECONDS) -> list:
+        """stop() rồi (nếu `revoke`) revoke hàng loạt các lease còn lại và đóng worker pool."""
+        lease_ids = self.stop()
+        if revoke:
+            self.revoke_leases(lease_ids, timeout)
+        self.close()
+        return lease_ids
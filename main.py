@@ -1,116 +1,226 @@
-import logging
-import threading
 import time
+# Mốc thời gian khởi động cho --startup-report, lấy trước mọi import khác
+_STARTED_AT = time.perf_counter()
+
+import argparse
+import logging
+import os
+import sys
+from typing import TYPE_CHECKING
 from config import (
     VAULT_ADDR, VAULT_TOKEN, VAULT_DB_ROLE,
-    MYSQL_HOST, MYSQL_PORT, MYSQL_INITIAL_DB,
-    DEFAULT_LEASE_DURATION_WARNING_SECONDS 
+    MYSQL_HOST, MYSQL_PORT, MYSQL_INITIAL_DB, MYSQL_POOL_SIZE,
+    BATCH_TRANSACTION_SIZE, BULK_BATCH_SIZE, BULK_COMMIT_ROWS, MYSQL_ALLOW_LOCAL_INFILE,
+    RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS,
+    METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL_SECONDS, GATEWAY_POOL_SIZE,
+    CREDENTIAL_SPARES_PER_ROLE, EXPORT_FORMATS
 )
 from vault_client import VaultClient
-from db_manager import DatabaseManager
-from sql_interactive import start_interactive_session
+from metrics import REGISTRY
+from startup import StartupReport
+
+if TYPE_CHECKING:
+    # Chi de chu thich kieu: db_manager keo theo mysql.connector, duoc import tre luc chay
+    from db_manager import DatabaseManager
+
+# db_manager (mysql.connector) và module của từng chế độ được import ở luồng
+# nền trong lúc chờ Vault, xem main(); các hàm run_*_mode import lại tại chỗ.
+MODE_MODULES = {
+    "serve": "gateway_server",
+    "export": "result_export",
+    "load": "bulk_loader",
+    "batch": "batch_runner",
+}
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-lease_revoked_state = {'revoked': False}
-revoke_lock = threading.Lock()
-
-def lease_expiry_monitor(
-    vault_client: VaultClient,
-    db_manager: DatabaseManager,
-    lease_duration: int,
-    lease_id: str,
-    shared_state: dict,
-    lock: threading.Lock 
-    ):
-    buffer_seconds = DEFAULT_LEASE_DURATION_WARNING_SECONDS if DEFAULT_LEASE_DURATION_WARNING_SECONDS > 0 else 10
-    sleep_duration = lease_duration - buffer_seconds
-
-    if sleep_duration <= 0:
-        logging.warning(f"[Monitor-{lease_id[:8]}] Thời gian lease ({lease_duration}s) quá ngắn hoặc buffer ({buffer_seconds}s) quá lớn, sẽ đóng và revoke ngay.")
-        sleep_duration = 0 
-    else:
-        logging.info(f"[Monitor-{lease_id[:8]}] Sẽ kiểm tra lease sau khoảng {sleep_duration:.2f} giây (Lease duration: {lease_duration}s)")
 
-    time.sleep(sleep_duration)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Công cụ SQL dùng credentials động từ Vault.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Chạy script SQL không tương tác từ FILE ('-' để đọc từ stdin).")
+    parser.add_argument("--batch-size", type=int, default=BATCH_TRANSACTION_SIZE,
+                        help="Số lệnh mỗi transaction (một lần commit) trong chế độ batch.")
+    parser.add_argument("--no-pipeline", action="store_true",
+                        help="Gửi từng lệnh một thay vì gộp nhiều lệnh trong một round trip.")
+    parser.add_argument("--continue-on-error", action="store_true",
+                        help="Tiếp tục batch kế tiếp khi một batch bị lỗi.")
+    parser.add_argument("--load", metavar="FILE",
+                        help="Nạp file CSV/TSV vào bảng chỉ định bởi --table.")
+    parser.add_argument("--table", help="Bảng đích cho --load.")
+    parser.add_argument("--load-method", choices=["auto", "insert", "load_data"], default="auto",
+                        help="auto: dùng LOAD DATA LOCAL INFILE nếu server cho phép, nếu không thì INSERT nhiều dòng.")
+    parser.add_argument("--load-batch-size", type=int, default=BULK_BATCH_SIZE,
+                        help="Số dòng mỗi lệnh INSERT nhiều dòng.")
+    parser.add_argument("--commit-every", type=int, default=BULK_COMMIT_ROWS,
+                        help="Số dòng giữa hai lần commit khi nạp dữ liệu.")
+    parser.add_argument("--no-header", action="store_true",
+                        help="File nạp không có dòng header (khi đó dữ liệu theo thứ tự cột của bảng).")
+    parser.add_argument("--columns",
+                        help="Danh sách cột đích cho --load, ngăn cách bởi dấu phẩy (mặc định: header của file, "
+                             "hoặc thứ tự cột của bảng nếu có --no-header).")
+    parser.add_argument("--export", metavar="FILE",
+                        help="Xuất kết quả của --query ra FILE (.csv/.jsonl, thêm .gz để nén).")
+    parser.add_argument("--query", help="Câu truy vấn dùng cho --export.")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS,
+                        help="Định dạng xuất, mặc định suy ra từ đuôi file.")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Phục vụ metrics tại http://127.0.0.1:PORT/metrics (0 = tắt).")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Ghi snapshot metrics định kỳ và khi thoát (.json hoặc text Prometheus).")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="Chạy gateway SQL qua HTTP tại PORT, dùng chung pool và lease cho mọi client.")
+    parser.add_argument("--serve-host", default="127.0.0.1",
+                        help="Địa chỉ lắng nghe cho --serve.")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="In thời gian từng giai đoạn khởi động (import, Vault, MySQL) ra stderr.")
+    args = parser.parse_args(argv)
+    if args.load and not args.table:
+        parser.error("--load cần --table.")
+    if args.export and not args.query:
+        parser.error("--export cần --query.")
+    return args
+
 
-    logging.info(f"[Monitor-{lease_id[:8]}] Thời gian chờ kết thúc, chuẩn bị đóng kết nối và kiểm tra revoke.")
-    if db_manager and db_manager.is_connected():
-        logging.info(f"[Monitor-{lease_id[:8]}] Đang đóng kết nối DB...")
-        db_manager.close() 
+def run_batch_mode(db_manager: "DatabaseManager", args) -> int:
+    from batch_runner import BatchRunner
+    runner = BatchRunner(
+        db_manager,
+        batch_size=args.batch_size,
+        pipeline=not args.no_pipeline,
+        stop_on_error=not args.continue_on_error
+    )
+    if args.batch == "-":
+        stats = runner.run(sys.stdin)
     else:
-        logging.warning(f"[Monitor-{lease_id[:8]}] Không có kết nối DB để đóng hoặc đã đóng.")
-    with lock:
-        if not shared_state['revoked']:
-            if vault_client and lease_id:
-                try:
-                    logging.info(f"[Monitor-{lease_id[:8]}] Đang thu hồi lease...")
-                    vault_client.revoke_lease(lease_id)
-                    shared_state['revoked'] = True
-                    logging.info(f"[Monitor-{lease_id[:8]}] Thu hồi lease thành công.")
-                except Exception as e:
-                    logging.error(f"[Monitor-{lease_id[:8]}] Lỗi khi thu hồi lease: {e}")
-            else:
-                logging.warning(f"[Monitor-{lease_id[:8]}] Không thể thu hồi lease: thiếu vault_client hoặc lease_id.")
-        else:
-            logging.info(f"[Monitor-{lease_id[:8]}] Lease đã được thu hồi bởi luồng khác, không cần thực hiện lại.")
+        with open(args.batch, encoding="utf-8") as script:
+            stats = runner.run(script)
+    return 1 if stats['failed_batches'] else 0
+
+
+def run_load_mode(db_manager: "DatabaseManager", args) -> int:
+    from bulk_loader import BulkLoader
+    loader = BulkLoader(db_manager, batch_size=args.load_batch_size, commit_rows=args.commit_every)
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else None
+    stats = loader.load(args.load, args.table, columns=columns, header=not args.no_header, method=args.load_method)
+    return 0 if stats else 1
+
+
+def run_serve_mode(db_manager: "DatabaseManager", args) -> int:
+    from gateway_server import QueryGateway
+    gateway = QueryGateway(db_manager)
+    server = gateway.serve(args.serve, host=args.serve_host)
+    try:
+        server.serve_forever()
+    finally:
+        gateway.close()
+    return 0
+
+
+def run_export_mode(db_manager: "DatabaseManager", args) -> int:
+    from result_export import export_query
+    stats = export_query(db_manager, args.query, args.export, fmt=args.export_format)
+    return 0 if stats else 1
 
-def main():
-    global lease_revoked_state, revoke_lock 
 
+def main(argv=None) -> int:
+    report = StartupReport(started_at=_STARTED_AT)
+    report.record("import main và config", _STARTED_AT, time.perf_counter())
+    args = parse_args(argv)
+    exit_code = 1
     vault_client_instance = None 
     db_manager = None
     lease_id = None
-    expiry_thread = None
+    metrics_server = None
+    metrics_writer = None
 
     try:
+        if args.metrics_port:
+            metrics_server = REGISTRY.start_http_server(args.metrics_port)
+        if args.metrics_file:
+            metrics_writer = REGISTRY.start_file_writer(args.metrics_file, METRICS_FILE_INTERVAL_SECONDS)
+
+        if args.batch and args.batch != "-" and not os.path.isfile(args.batch):
+            logging.error(f"Không tìm thấy file script SQL: {args.batch}")
+            return exit_code
+        if args.load and not os.path.isfile(args.load):
+            logging.error(f"Không tìm thấy file dữ liệu: {args.load}")
+            return exit_code
         if not VAULT_TOKEN:
              logging.error("Thiếu VAULT_TOKEN trong cấu hình (.env hoặc biến môi trường).")
-             return
-        vault_client_instance = VaultClient(vault_addr=VAULT_ADDR, vault_token=VAULT_TOKEN)
+             return exit_code
+
+        # Import mysql.connector và module của chế độ chạy song song với các round trip tới Vault
+        mode = next((name for name in MODE_MODULES if getattr(args, name)), None)
+        report.preload("db_manager", MODE_MODULES.get(mode, "sql_interactive"))
+
+        with report.phase("Vault: import hvac + xác thực"):
+            vault_client_instance = VaultClient(vault_addr=VAULT_ADDR, vault_token=VAULT_TOKEN)
         if not vault_client_instance.is_authenticated():
              logging.error("Xác thực Vault thất bại. Kiểm tra địa chỉ và token.")
-             return
+             return exit_code
         logging.info("Xác thực Vault thành công.")
 
-        db_creds = vault_client_instance.get_db_credentials(VAULT_DB_ROLE)
+        if CREDENTIAL_SPARES_PER_ROLE > 0:
+            # Spare được tạo ở nền, sẵn sàng cho lần xoay vòng credentials kế tiếp
+            vault_client_instance.enable_credential_broker(VAULT_DB_ROLE)
+        with report.phase("Vault: lấy credentials"):
+            db_creds = vault_client_instance.acquire_db_credentials(VAULT_DB_ROLE)
         if not db_creds:
             logging.error("Không thể lấy credentials từ Vault.")
-            return
+            return exit_code
 
         lease_id = db_creds['lease_id']
         lease_duration = db_creds['lease_duration']
         username = db_creds['username']
         password = db_creds['password']
         logging.info(f"Lấy thành công credentials cho user: {username}, Lease ID: {lease_id[:8]}..., Duration: {lease_duration}s")
-        db_manager = DatabaseManager(host=MYSQL_HOST, port=MYSQL_PORT, initial_db=MYSQL_INITIAL_DB)
-        if not db_manager.connect(username=username, password=password):
+        with report.phase("chờ import db_manager"):
+            from db_manager import DatabaseManager
+        db_manager = DatabaseManager(
+            host=MYSQL_HOST, port=MYSQL_PORT, initial_db=MYSQL_INITIAL_DB,
+            pool_size=MYSQL_POOL_SIZE or (GATEWAY_POOL_SIZE if args.serve else 0),
+            allow_local_infile=MYSQL_ALLOW_LOCAL_INFILE
+        )
+        if RESULT_CACHE_MAX_BYTES > 0:
+            db_manager.enable_result_cache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+        with report.phase("MySQL: kết nối"):
+            connected = db_manager.connect(username=username, password=password, lease_id=lease_id)
+        if not connected:
             logging.error("Kết nối tới MySQL thất bại.")
-            return
+            return exit_code
         logging.info("Kết nối MySQL thành công.")
 
-        with revoke_lock:
-            lease_revoked_state['revoked'] = False
-
-        expiry_thread = threading.Thread(
-            target=lease_expiry_monitor,
-            args=(
-                vault_client_instance,
-                db_manager,
-                lease_duration,
-                lease_id,
-                lease_revoked_state,
-                revoke_lock         
-            ),
-            daemon=True 
+        vault_client_instance.start_lease_renewal(
+            role_name=VAULT_DB_ROLE,
+            creds=db_creds,
+            on_rotate=lambda creds: db_manager.swap_credentials(
+                username=creds['username'],
+                password=creds['password'],
+                lease_id=creds['lease_id']
+            )
         )
-        expiry_thread.start()
-        logging.info(f"Đã khởi động luồng theo dõi cho lease: {lease_id[:8]}...")
+        logging.info(f"Đã khởi động gia hạn tự động cho lease: {lease_id[:8]}...")
+        if args.startup_report:
+            print(report.render(), file=sys.stderr)
 
-        start_interactive_session(db_manager)
-        logging.info("Phiên tương tác SQL kết thúc.")
+        if args.serve:
+            exit_code = run_serve_mode(db_manager, args)
+        elif args.export:
+            exit_code = run_export_mode(db_manager, args)
+        elif args.load:
+            exit_code = run_load_mode(db_manager, args)
+        elif args.batch:
+            exit_code = run_batch_mode(db_manager, args)
+        else:
+            from sql_interactive import start_interactive_session
+            start_interactive_session(db_manager)
+            logging.info("Phiên tương tác SQL kết thúc.")
+            exit_code = 0
 
     except (ValueError, ConnectionError) as e:
         logging.error(f"Lỗi cấu hình hoặc kết nối ban đầu: {e}")
+    except OSError as e:
+        logging.error(f"Không đọc được file đầu vào: {e}")
     except KeyboardInterrupt:
         logging.info("Nhận tín hiệu KeyboardInterrupt (Ctrl+C), đang thoát...")
     except Exception as e:
@@ -118,31 +228,48 @@ def main():
     finally:
         logging.info("Bắt đầu quá trình dọn dẹp (finally)...")
 
-        if db_manager and db_manager.is_connected():
+        lease_ids = [lease_id] if lease_id else []
+        lease_scheduler = vault_client_instance.lease_scheduler if vault_client_instance else None
+        if lease_scheduler:
+            # Lease có thể đã được xoay vòng, lấy các lease hiện tại để revoke
+            lease_ids = lease_scheduler.stop()
+            logging.info("[Main-Finally] Đã dừng bộ lập lịch gia hạn lease.")
+
+        if db_manager:
+            # Luôn đóng, kể cả khi kết nối đã mất: còn luồng keepalive, pool và kết nối điều khiển
             logging.info("[Main-Finally] Đang đóng kết nối DB...")
             db_manager.close()
         else:
-            logging.info("[Main-Finally] Kết nối DB đã đóng hoặc chưa được tạo.")
-
-        if lease_id: 
-            with revoke_lock:
-                if not lease_revoked_state['revoked']:
-                    if vault_client_instance:
-                        try:
-                            logging.info(f"[Main-Finally] Đang thu hồi lease: {lease_id[:8]}...")
-                            vault_client_instance.revoke_lease(lease_id)
-                            lease_revoked_state['revoked'] = True
-                            logging.info(f"[Main-Finally] Thu hồi lease thành công.")
-                        except Exception as e:
-                            logging.warning(f"[Main-Finally] Lỗi khi thu hồi lease (có thể đã hết hạn/bị revoke bởi monitor): {e}")
-                    else:
-                        logging.warning(f"[Main-Finally] Không có Vault client để thu hồi lease: {lease_id[:8]}...")
-                else:
-                    logging.info(f"[Main-Finally] Lease {lease_id[:8]}... đã được thu hồi bởi luồng monitor.")
+            logging.info("[Main-Finally] Kết nối DB chưa được tạo.")
+
+        if lease_ids:
+            if lease_scheduler:
+                logging.info(f"[Main-Finally] Đang thu hồi {len(lease_ids)} lease...")
+                lease_scheduler.revoke_leases(lease_ids)
+            elif vault_client_instance:
+                logging.info(f"[Main-Finally] Đang thu hồi lease: {lease_ids[0][:8]}...")
+                vault_client_instance.revoke_lease(lease_ids[0])
+            else:
+                logging.warning(f"[Main-Finally] Không có Vault client để thu hồi lease: {lease_ids[0][:8]}...")
         else:
             logging.info("[Main-Finally] Không có lease ID để thu hồi.")
+        if lease_scheduler:
+            lease_scheduler.close()
+        if vault_client_instance and vault_client_instance.credential_broker:
+            vault_client_instance.credential_broker.close()
+
+        if metrics_writer:
+            metrics_writer.set()
+            try:
+                REGISTRY.write_file(args.metrics_file)
+                logging.info(f"[Main-Finally] Đã ghi metrics ra {args.metrics_file}.")
+            except OSError as e:
+                logging.warning(f"[Main-Finally] Không ghi được file metrics: {e}")
+        if metrics_server:
+            metrics_server.shutdown()
         logging.info("All done!")
+    return exit_code
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,272 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Bucket (giay) cho do tre: tu 0.5ms toi 60s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in key) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, function, **labels):
+        """Giá trị được tính lúc xuất metrics (vd. thời gian lease còn lại)."""
+        with self._lock:
+            self._functions[_label_key(labels)] = function
+
+    def remove(self, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+            self._functions.pop(key, None)
+
+    def samples(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                values[key] = function()
+            except Exception as e:
+                logging.debug(f"Loi khi tinh gauge {self.name}: {e}")
+        return [(self.name, key, value) for key, value in values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # key -> [dem theo bucket..., dem +Inf, tong]
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: list(state) for key, state in self._values.items()}
+
+    def samples(self) -> list:
+        samples = []
+        for key, state in self.snapshot().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+            cumulative += state[len(self.buckets)]
+            samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), cumulative))
+            samples.append((f"{self.name}_count", key, cumulative))
+            samples.append((f"{self.name}_sum", key, state[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Registry metrics trong tiến trình: xuất dạng text Prometheus hoặc JSON,
+    ghi ra file định kỳ hoặc phục vụ qua HTTP (/metrics, /metrics.json).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def _get_or_create(self, cls, name: str, help_text: str, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' da duoc dang ky voi kieu {metric.kind}.")
+            return metric
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                series = []
+                for key, state in metric.snapshot().items():
+                    count = sum(state[:-1])
+                    series.append({
+                        "labels": dict(key),
+                        "count": count,
+                        "sum": state[-1],
+                        "mean": state[-1] / count if count else 0.0,
+                        "buckets": dict(zip([*map(repr, metric.buckets), "+Inf"], state[:-1])),
+                    })
+            else:
+                series = [{"labels": dict(key), "value": value} for _, key, value in metric.samples()]
+            result[metric.name] = {"type": metric.kind, "help": metric.help, "series": series}
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+    def write_file(self, path: str):
+        """Ghi snapshot ra file (.json -> JSON, còn lại -> text Prometheus), thay thế nguyên tử."""
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write(content)
+        os.replace(tmp_path, path)
+
+    def start_file_writer(self, path: str, interval: float) -> threading.Event:
+        """Ghi file metrics mỗi `interval` giây trong luồng nền; set() event trả về để dừng."""
+        stop_event = threading.Event()
+
+        def _loop():
+            while not stop_event.wait(interval):
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    logging.warning(f"Khong ghi duoc file metrics '{path}': {e}")
+
+        threading.Thread(target=_loop, name="MetricsFileWriter", daemon=True).start()
+        return stop_event
+
+    def start_http_server(self, port: int, host: str = "127.0.0.1"):
+        # http.server nặng (kéo theo email, http.client), chỉ import khi bật metrics HTTP
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, content_type = registry.to_json(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"metrics http: {format % args}")
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True).start()
+        logging.info(f"Metrics phuc vu tai http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+REGISTRY = MetricsRegistry()
+
+QUERY_LATENCY = REGISTRY.histogram("sql_query_duration_seconds", "Thoi gian thuc thi lenh SQL (tinh den khi server tra loi)")
+QUERY_ERRORS = REGISTRY.counter("sql_query_errors_total", "So lenh SQL bi loi")
+ROWS_FETCHED = REGISTRY.counter("sql_rows_fetched_total", "So dong da doc tu server")
+RESULT_BYTES = REGISTRY.counter("sql_result_bytes_estimated_total", "Uoc tinh so byte ket qua da doc (lay mau dong dau moi lo)")
+CONNECT_LATENCY = REGISTRY.histogram("db_connect_duration_seconds", "Thoi gian mo ket noi MySQL (TCP + xac thuc)")
+POOL_ACQUIRE_LATENCY = REGISTRY.histogram("db_pool_acquire_duration_seconds", "Thoi gian cho lay ket noi tu pool")
+POOL_CONNECTIONS = REGISTRY.gauge("db_pool_connections", "So ket noi trong pool theo trang thai")
+VAULT_LATENCY = REGISTRY.histogram("vault_request_duration_seconds", "Thoi gian goi Vault theo thao tac")
+VAULT_ERRORS = REGISTRY.counter("vault_request_errors_total", "So lan goi Vault that bai theo thao tac")
+LEASE_REMAINING = REGISTRY.gauge("vault_lease_time_remaining_seconds", "Thoi gian con lai cua lease dang dung")
+BROKER_REQUESTS = REGISTRY.counter("vault_credential_broker_requests_total", "So lan lay credentials qua broker (hit = dung spare)")
+BROKER_SPARES = REGISTRY.gauge("vault_credential_broker_spares", "So bo credentials du phong dang giu")
+QUERY_RETRIES = REGISTRY.counter("sql_query_retries_total", "So lan chay lai lenh SQL sau loi tam thoi")
+DB_RECONNECTS = REGISTRY.counter("db_reconnects_total", "So lan mo lai ket noi MySQL sau khi mat ket noi")
+DB_KEEPALIVE_PINGS = REGISTRY.counter("db_keepalive_pings_total", "So lan ping nen khi ket noi ranh")
+
+
+def estimate_row_bytes(row) -> int:
+    size = 0
+    for value in row:
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import PARALLEL_QUERY_TIMEOUT_SECONDS
+from db_manager import DatabaseManager
+from mysql.connector import Error
+
+
+class QueryTask:
+
+    def __init__(self, sql: str, database: str | None = None, label: str | None = None, max_rows: int = 0):
+        self.sql = sql
+        self.database = database
+        self.label = label or (f"{database}: {sql[:40]}" if database else sql[:40])
+        self.max_rows = max_rows
+
+
+class QueryResult:
+
+    def __init__(self, task: QueryTask):
+        self.task = task
+        self.columns = None
+        self.rows = None
+        self.rowcount = None
+        self.error = None
+        self.timed_out = False
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ParallelQueryExecutor:
+    """
+    Chạy nhiều truy vấn độc lập song song trên các kết nối của pool (cùng
+    một lease Vault), trả kết quả theo thứ tự hoàn thành. Truy vấn chạy quá
+    `timeout` giây hoặc bị hủy sẽ bị dừng phía server bằng KILL QUERY.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, max_workers: int | None = None,
+                 timeout: float = PARALLEL_QUERY_TIMEOUT_SECONDS):
+        if not db_manager.pool:
+            raise ValueError("ParallelQueryExecutor can DatabaseManager o che do pool (pool_size > 0).")
+        self.db_manager = db_manager
+        self.max_workers = max_workers or db_manager.pool.pool_size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ParallelQuery")
+        self._lock = threading.Lock()
+        # task -> [connection_id, thoi diem bat dau, da gui KILL chua]
+        self._running = {}
+        self._futures = []
+        self._cancelled = False
+
+    def run(self, tasks, timeout: float | None = None):
+        """Generator: gửi tất cả `tasks` rồi yield từng QueryResult ngay khi xong."""
+        timeout = self.timeout if timeout is None else timeout
+        self._cancelled = False
+        tasks = [task if isinstance(task, QueryTask) else QueryTask(task) for task in tasks]
+        futures = {self._executor.submit(self._run_task, task): task for task in tasks}
+        self._futures = list(futures)
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=self._next_deadline(timeout), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.cancelled():
+                        result = QueryResult(futures[future])
+                        result.cancelled = True
+                        result.error = "cancelled"
+                        yield result
+                    else:
+                        yield future.result()
+                self._kill_overdue(timeout)
+        except (KeyboardInterrupt, GeneratorExit):
+            self.cancel()
+            raise
+
+    def cancel(self):
+        """Hủy các truy vấn chưa bắt đầu và KILL QUERY các truy vấn đang chạy."""
+        self._cancelled = True
+        for future in self._futures:
+            future.cancel()
+        with self._lock:
+            running = list(self._running.values())
+        for state in running:
+            self._kill(state)
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _run_task(self, task: QueryTask) -> QueryResult:
+        result = QueryResult(task)
+        if self._cancelled:
+            result.cancelled = True
+            result.error = "cancelled"
+            return result
+
+        start_time = time.perf_counter()
+        state = None
+        try:
+            with self.db_manager.pooled_connection() as pooled:
+                state = [pooled.connection.connection_id, time.monotonic(), False]
+                with self._lock:
+                    self._running[task] = state
+                cursor = pooled.cursor()
+                try:
+                    if task.database:
+                        # Pool dat lai schema (hoac bo ket noi neu khong dat lai duoc) khi tra ve
+                        pooled.use_database(task.database)
+                    cursor.execute(task.sql)
+                    if cursor.description:
+                        result.columns = [col[0] for col in cursor.description]
+                        result.rows = cursor.fetchmany(task.max_rows) if task.max_rows else cursor.fetchall()
+                    result.rowcount = cursor.rowcount
+                finally:
+                    with self._lock:
+                        self._running.pop(task, None)
+                    # Dung o max_rows: KILL phan con lai thay vi de cursor.close() bao "Unread result found"
+                    if not self.db_manager.cancel_pooled_result(pooled.connection):
+                        pooled.broken = True
+                    cursor.close()
+        except Error as e:
+            result.error = str(e)
+            if state and state[2]:
+                result.timed_out = not self._cancelled
+                result.cancelled = self._cancelled
+            logging.error(f"Truy van '{task.label}' that bai: {e}")
+        except ConnectionError as e:
+            result.error = str(e)
+            logging.error(f"Truy van '{task.label}' khong lay duoc ket noi: {e}")
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+    def _next_deadline(self, timeout: float) -> float | None:
+        if not timeout:
+            return None
+        with self._lock:
+            starts = [state[1] for state in self._running.values() if not state[2]]
+        if not starts:
+            # Chua co truy van nao bat dau, kiem tra lai sau mot khoang ngan
+            return min(timeout, 1.0)
+        return max(0.0, min(starts) + timeout - time.monotonic())
+
+    def _kill_overdue(self, timeout: float):
+        if not timeout:
+            return
+        now = time.monotonic()
+        with self._lock:
+            overdue = [state for state in self._running.values() if not state[2] and now - state[1] >= timeout]
+        for state in overdue:
+            logging.warning(f"Truy van tren ket noi {state[0]} vuot qua {timeout}s, dang KILL QUERY.")
+            self._kill(state)
+
+    def _kill(self, state: list):
+        with self._lock:
+            if state[2]:
+                return
+            state[2] = True
+        self.db_manager.kill_query(state[0])
@@ -0,0 +1,95 @@
+import logging
+from collections import OrderedDict
+from config import PREPARED_STATEMENT_CACHE_SIZE
+from mysql.connector import Error, InterfaceError, ProgrammingError
+
+
+class PreparedStatementCache:
+    """
+    LRU các prepared statement phía server của một kết nối, khóa theo nội
+    dung SQL. Mỗi câu SQL được prepare một lần; các lần sau chỉ gửi tham số.
+    Cache gắn chặt với một kết nối: khi kết nối/credentials đổi thì phải
+    gọi clear() (các statement cũ không dùng được trên kết nối mới).
+    """
+
+    def __init__(self, connection, max_size: int = PREPARED_STATEMENT_CACHE_SIZE):
+        self.connection = connection
+        self.max_size = max(1, max_size)
+        # sql -> (cursor, chinh doi tuong chuoi sql da prepare)
+        self._statements = OrderedDict()
+        self._active = None
+        self.hits = 0
+        self.misses = 0
+
+    def execute(self, sql_command: str, params=()):
+        """
+        Thực thi `sql_command` với `params` qua statement đã prepare và trả
+        về cursor. Cursor thuộc về cache: caller đọc kết quả nhưng không đóng nó.
+        """
+        self.drain()
+        entry = self._statements.get(sql_command)
+        if entry is not None:
+            self._statements.move_to_end(sql_command)
+            self.hits += 1
+            cursor, prepared_sql = entry
+            try:
+                # mysql.connector so sanh operation bang 'is' de quyet dinh co prepare lai khong
+                cursor.execute(prepared_sql, params)
+                self._active = cursor
+                return cursor
+            except (InterfaceError, ProgrammingError) as e:
+                # Statement/cursor khong con hop le (vd. bi dong), prepare lai mot lan
+                logging.debug(f"Prepared statement khong con hop le, prepare lai: {e}")
+                self.evict(sql_command)
+
+        self.misses += 1
+        cursor = self.connection.cursor(prepared=True)
+        try:
+            cursor.execute(sql_command, params)
+        except Error:
+            self._close_cursor(cursor)
+            raise
+        self._statements[sql_command] = (cursor, sql_command)
+        self._active = cursor
+        while len(self._statements) > self.max_size:
+            _, (old_cursor, _) = self._statements.popitem(last=False)
+            self._close_cursor(old_cursor)
+        return cursor
+
+    def evict(self, sql_command: str):
+        entry = self._statements.pop(sql_command, None)
+        if entry is not None:
+            self._close_cursor(entry[0])
+
+    def clear(self, release: bool = True):
+        """Xóa cache; release=False khi kết nối sắp đóng (server tự giải phóng statement)."""
+        statements = list(self._statements.values())
+        self._statements.clear()
+        self._active = None
+        if release:
+            for cursor, _ in statements:
+                self._close_cursor(cursor)
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def drain(self):
+        """Đọc nốt kết quả của statement gần nhất để kết nối nhận lệnh mới."""
+        active = self._active
+        self._active = None
+        if active is None:
+            return
+        try:
+            if self.connection.unread_result:
+                active.fetchall()
+        except Error as e:
+            logging.debug(f"Loi khi doc not ket qua cua prepared statement truoc: {e}")
+
+    def _close_cursor(self, cursor):
+        if cursor is self._active:
+            self.drain()
+        try:
+            # Dong cursor prepared se giai phong statement phia server
+            cursor.close()
+        except Error as e:
+            logging.debug(f"Loi khi dong prepared statement: {e}")
@@ -0,0 +1,213 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.S)
+_WHITESPACE = re.compile(r"\s+")
+_TABLE_NAME = r"(?:`[^`]+`|[\w$]+)(?:\.(?:`[^`]+`|[\w$]+))?"
+_TABLE_REFS = re.compile(
+    rf"\b(?:FROM|JOIN|UPDATE|INTO|TABLE|TABLES)\s+({_TABLE_NAME}(?:\s*,\s*{_TABLE_NAME})*)",
+    re.I
+)
+_NON_DETERMINISTIC = re.compile(
+    r"\b(?:NOW|SYSDATE|CURDATE|CURTIME|CURRENT_TIMESTAMP|CURRENT_DATE|CURRENT_TIME|UTC_TIMESTAMP|"
+    r"UNIX_TIMESTAMP|RAND|UUID|UUID_SHORT|CONNECTION_ID|LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|SLEEP|"
+    r"GET_LOCK|RELEASE_LOCK|NEXTVAL)\b|@|\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bFOR\s+SHARE\b",
+    re.I
+)
+_LEADING_NOISE = re.compile(r"(?:\s+|/\*.*?\*/|(?:--\s|#)[^\n]*(?:\n|$)|\()*", re.S)
+_WRITE_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "REPLACE", "LOAD"}
+_DDL_KEYWORDS = {"ALTER", "DROP", "CREATE", "RENAME", "TRUNCATE"}
+
+
+def normalize_sql(sql_command: str) -> str:
+    """Gộp khoảng trắng và bỏ ';' cuối, giữ nguyên chuỗi literal."""
+    parts = []
+    last = 0
+    for match in _LITERALS.finditer(sql_command):
+        parts.append(_WHITESPACE.sub(" ", sql_command[last:match.start()]))
+        parts.append(match.group())
+        last = match.end()
+    parts.append(_WHITESPACE.sub(" ", sql_command[last:]))
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def referenced_tables(sql_command: str) -> frozenset:
+    """Tên bảng (chữ thường, bỏ tên database) mà câu lệnh đọc hoặc ghi."""
+    stripped = _LITERALS.sub("''", sql_command)
+    tables = set()
+    for match in _TABLE_REFS.finditer(stripped):
+        for name in match.group(1).split(","):
+            tables.add(name.strip().split(".")[-1].strip("`").lower())
+    return frozenset(tables)
+
+
+def statement_keyword(sql_command: str) -> str:
+    # Bo comment va dau '(' o dau de lay dung tu khoa cua cau lenh
+    start = _LEADING_NOISE.match(sql_command).end()
+    words = sql_command[start:start + 32].split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def use_target(sql_command: str) -> str | None:
+    """Schema được chọn bởi lệnh USE, None nếu không phải lệnh USE."""
+    start = _LEADING_NOISE.match(sql_command).end()
+    parts = sql_command[start:].split(None, 1)
+    if len(parts) != 2 or parts[0].upper() != "USE":
+        return None
+    return parts[1].strip().rstrip(";").strip().strip("`") or None
+
+
+def is_cacheable(sql_command: str) -> bool:
+    return statement_keyword(sql_command) in ("SELECT", "WITH") and not _NON_DETERMINISTIC.search(
+        _LITERALS.sub("''", sql_command)
+    )
+
+
+def classify_write(sql_command: str) -> tuple[str | None, frozenset]:
+    """Trả về ('dml'|'ddl'|None, các bảng bị ghi) để biết khi nào phải hủy cache."""
+    keyword = statement_keyword(sql_command)
+    if keyword in _WRITE_KEYWORDS:
+        return "dml", referenced_tables(sql_command)
+    if keyword in _DDL_KEYWORDS:
+        return "ddl", referenced_tables(sql_command)
+    return None, frozenset()
+
+
+def classify_script(sql_script: str) -> tuple[str | None, frozenset]:
+    """
+    Như classify_write cho script nhiều lệnh. Tách thô theo ';' (kể cả ';'
+    trong chuỗi) chỉ khiến hủy cache nhiều hơn cần, không bỏ sót lệnh ghi.
+    """
+    kind = None
+    tables = set()
+    for piece in sql_script.split(";"):
+        piece_kind, piece_tables = classify_write(piece)
+        if piece_kind:
+            kind = "ddl" if "ddl" in (kind, piece_kind) else "dml"
+            tables |= piece_tables
+    return kind, frozenset(tables)
+
+
+def _estimate_size(columns: list, rows: list) -> int:
+    size = 64 + 64 * len(columns)
+    for row in rows:
+        size += 56 + 8 * len(row)
+        for value in row:
+            if isinstance(value, (str, bytes, bytearray)):
+                size += 49 + len(value)
+            else:
+                size += 32
+    return size
+
+
+class QueryResultCache:
+    """
+    Cache kết quả đọc (LRU theo dung lượng ước tính, TTL từng entry). Mỗi
+    entry ghi lại các bảng nó đọc để bị hủy khi một lệnh ghi vào các bảng
+    đó được commit.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, default_ttl: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        # key -> (columns, rows, tables, size, expires_at)
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._bytes = 0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(sql_command: str, params=(), database: str | None = None) -> tuple:
+        # Cung cau SQL tren hai schema khac nhau (sau USE) la hai ket qua khac nhau
+        return database, normalize_sql(sql_command), tuple(params or ())
+
+    @property
+    def generation(self) -> int:
+        """Tăng sau mỗi lần hủy; put() bỏ qua kết quả đọc trước lần hủy gần nhất."""
+        return self._generation
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[4] <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: tuple, columns: list, rows: list, tables: frozenset,
+            ttl: float | None = None, generation: int | None = None) -> bool:
+        size = _estimate_size(columns, rows)
+        if size > self.max_bytes:
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Co lenh ghi duoc commit trong luc doc, ket qua co the da cu
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (columns, rows, tables, size, time.monotonic() + ttl)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate_tables(self, tables) -> int:
+        with self._lock:
+            self._generation += 1
+            keys = set()
+            for table in tables:
+                keys |= self._by_table.pop(table, set())
+            for key in keys:
+                self._remove(key)
+        if keys:
+            logging.debug(f"Huy {len(keys)} ket qua cache cua bang: {', '.join(sorted(tables))}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[3]
+        for table in entry[2]:
+            keys = self._by_table.get(table)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
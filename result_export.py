@@ -0,0 +1,101 @@
+import csv
+import datetime
+import decimal
+import gzip
+import json
+import logging
+import time
+from config import SQL_FETCH_BATCH_SIZE, EXPORT_FORMATS, EXPORT_GZIP_LEVEL
+from db_manager import DatabaseManager
+from mysql.connector import Error
+from result_stream import iter_batches
+
+
+def detect_format(path: str) -> tuple[str | None, bool]:
+    """Suy ra (định dạng, có nén gzip) từ đuôi file, vd. out.csv.gz -> ('csv', True)."""
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl", compressed
+    if name.endswith((".csv", ".tsv")):
+        return "csv", compressed
+    return None, compressed
+
+
+def json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return value.hex()
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"Khong chuyen duoc kieu {type(value).__name__} sang JSON")
+
+
+def _open_output(path: str, compressed: bool):
+    if compressed:
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=EXPORT_GZIP_LEVEL)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def export_query(db_manager: DatabaseManager, sql_command: str, path: str, fmt: str | None = None,
+                 compress: bool | None = None, batch_size: int = SQL_FETCH_BATCH_SIZE) -> dict | None:
+    """
+    Ghi kết quả truy vấn thẳng ra file CSV hoặc JSON Lines (tùy chọn gzip),
+    đọc bằng cursor không buffer theo từng lô nên bộ nhớ không phụ thuộc
+    vào số dòng.
+    """
+    detected_fmt, detected_compress = detect_format(path)
+    fmt = fmt or detected_fmt
+    compress = detected_compress if compress is None else compress
+    if fmt not in EXPORT_FORMATS:
+        logging.error(f"Khong xac dinh duoc dinh dang xuat cho '{path}' (ho tro: {', '.join(EXPORT_FORMATS)}).")
+        return None
+
+    start_time = time.perf_counter()
+    cursor = db_manager.execute_sql(sql_command)
+    if not cursor:
+        return None
+    row_count = 0
+    try:
+        if not cursor.description:
+            logging.error("Lenh khong tra ve du lieu, khong co gi de xuat.")
+            return None
+        columns = [col[0] for col in cursor.description]
+        delimiter = "\t" if path.lower().endswith((".tsv", ".tsv.gz")) else ","
+        with _open_output(path, compress) as out:
+            if fmt == "csv":
+                writer = csv.writer(out, delimiter=delimiter)
+                writer.writerow(columns)
+                for rows in iter_batches(cursor, batch_size):
+                    writer.writerows(rows)
+                    row_count += len(rows)
+            else:
+                encode = json.JSONEncoder(ensure_ascii=False, default=json_default).encode
+                for rows in iter_batches(cursor, batch_size):
+                    out.write("\n".join([encode(dict(zip(columns, row))) for row in rows]))
+                    out.write("\n")
+                    row_count += len(rows)
+    except OSError as e:
+        logging.error(f"Loi khi ghi file '{path}': {e}")
+        return None
+    except Error as e:
+        logging.error(f"Loi khi doc ket qua de xuat ra '{path}': {e}")
+        return None
+    finally:
+        db_manager.discard_unread_result()
+        try:
+            cursor.close()
+        except Error as ce:
+            logging.warning(f"Loi khi dong cursor: {ce}")
+
+    elapsed = time.perf_counter() - start_time
+    logging.info(f"-> Da xuat {row_count} dong ra '{path}' trong {elapsed:.2f} giay.")
+    return {"rows": row_count, "path": path, "format": fmt, "compressed": compress, "elapsed": elapsed}
@@ -0,0 +1,236 @@
+import decimal
+from itertools import repeat
+from config import SQL_MAX_COLUMN_WIDTH, SQL_ALIGN_SAMPLE_ROWS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RENDER_FORMATS = ("table", "vertical", "plain", "stats")
+_NUMERIC_TYPES = (int, float, decimal.Decimal)
+
+
+def _bytes_to_text(value) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return "0x" + value.hex()
+    return str(value)
+
+
+def _first_value(values):
+    for value in values:
+        if value is not None:
+            return value
+    return None
+
+
+def format_column(values, null: str = "NULL") -> tuple[list, bool]:
+    """
+    Chuyển một cột sang chuỗi bằng một hàm chọn theo kiểu của cột (không
+    xét kiểu từng ô), trả về (các ô, có phải cột số không).
+    """
+    sample = _first_value(values)
+    if sample is None:
+        return [null] * len(values), False
+    convert = _bytes_to_text if isinstance(sample, (bytes, bytearray)) else str
+    numeric = isinstance(sample, _NUMERIC_TYPES) and not isinstance(sample, bool)
+    has_null = None in values
+    if isinstance(sample, str) and not has_null:
+        return list(values), False
+    if has_null:
+        return [null if value is None else convert(value) for value in values], numeric
+    return list(map(convert, values)), numeric
+
+
+def _truncate(cells: list, width: int) -> list:
+    return [cell if len(cell) <= width else cell[:width - 1] + "…" for cell in cells]
+
+
+class _ColumnStats:
+    """Cộng dồn thống kê một cột qua các lô; cột số dùng NumPy nếu có."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.type_name = None
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.total = None
+        self.max_len = None
+
+    def update(self, column: tuple):
+        values = [value for value in column if value is not None] if None in column else column
+        self.nulls += len(column) - len(values)
+        if not values:
+            return
+        self.count += len(values)
+        sample = values[0]
+        self.type_name = self.type_name or type(sample).__name__
+        if isinstance(sample, (str, bytes, bytearray)):
+            longest = max(map(len, values))
+            self.max_len = longest if self.max_len is None else max(self.max_len, longest)
+            return
+        low, high, total = self._aggregate(values, sample)
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        if total is not None:
+            self.total = total if self.total is None else self.total + total
+
+    @staticmethod
+    def _aggregate(values, sample) -> tuple:
+        numeric = isinstance(sample, _NUMERIC_TYPES) and not isinstance(sample, bool)
+        # Tong tinh bang sum() cua Python: int64.sum() cua NumPy tran so am tham
+        total = sum(values) if numeric else None
+        if np is not None and isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            try:
+                array = np.asarray(values, dtype=np.int64 if isinstance(sample, int) else np.float64)
+                cast = int if isinstance(sample, int) else float
+                return cast(array.min()), cast(array.max()), total
+            except (OverflowError, ValueError, TypeError):
+                # BIGINT UNSIGNED vuot int64 hoac kieu lan: dung cach thuan Python
+                pass
+        return min(values), max(values), total
+
+    def row(self) -> tuple:
+        mean = None
+        if self.total is not None and self.count:
+            mean = self.total / self.count
+        return (self.name, self.type_name, self.count, self.nulls, self.min, self.max, mean, self.max_len)
+
+
+class ResultRenderer:
+    """
+    Hiển thị kết quả theo cột: mỗi lô được chuyển vị thành các cột, định
+    dạng, đo độ rộng và căn lề theo cả cột, rồi mới ghép lại thành dòng.
+    Độ rộng cột được chốt từ `align_rows` dòng đầu; chuỗi dài hơn ở các lô
+    sau bị cắt để bảng không bị lệch (số thì không bao giờ bị cắt).
+    Hỗ trợ bảng căn lề, dạng dọc (\\G), plain và thống kê.
+    """
+
+    def __init__(self, fmt: str = "table", max_width: int = SQL_MAX_COLUMN_WIDTH, null: str = "NULL",
+                 align_rows: int = SQL_ALIGN_SAMPLE_ROWS):
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"Dinh dang hien thi khong ho tro: {fmt} (ho tro: {', '.join(RENDER_FORMATS)})")
+        self.fmt = fmt
+        self.max_width = max_width
+        self.null = null
+        self.align_rows = align_rows
+
+    def render(self, columns: list, batches, out) -> int:
+        """Ghi từng lô ngay khi nhận được, trả về số dòng đã ghi (như write_rows)."""
+        if self.fmt == "stats":
+            return self._render_stats(columns, batches, out)
+        if self.fmt == "vertical":
+            return self._render_vertical(columns, batches, out)
+        return self._render_table(columns, batches, out, borders=self.fmt == "table")
+
+    def _format_batch(self, rows: list) -> tuple[list, list]:
+        cells, numeric = [], []
+        for column in zip(*rows):
+            formatted, is_numeric = format_column(column, self.null)
+            cells.append(formatted)
+            numeric.append(is_numeric)
+        return cells, numeric
+
+    def _render_table(self, columns: list, batches, out, borders: bool) -> int:
+        # Giu toi da align_rows dong dau de chot do rong cot, sau do stream cac lo con lai theo do rong nay
+        batches = iter(batches)
+        sample = []
+        sample_rows = 0
+        for rows in batches:
+            if rows:
+                sample.append(self._format_batch(rows))
+                sample_rows += len(rows)
+                if sample_rows >= self.align_rows:
+                    break
+        if not sample:
+            return 0
+
+        # Rong it nhat bang chu NULL nhu client mysql, de o NULL o lo sau khong bi cat
+        widths = [max(len(name), len(self.null)) for name in columns]
+        for cells, _ in sample:
+            for index, column_cells in enumerate(cells):
+                widths[index] = max(widths[index], max(map(len, column_cells)))
+        if self.max_width:
+            widths = [min(width, max(self.max_width, len(name))) for width, name in zip(widths, columns)]
+
+        header = " | ".join(name.ljust(width) for name, width in zip(columns, widths))
+        separator = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+        if borders:
+            out.write(f"{separator}\n| {header} |\n{separator}\n")
+        else:
+            out.write(header.rstrip() + "\n" + "-" * len(header) + "\n")
+
+        row_count = 0
+        for cells, numeric in sample:
+            row_count += self._write_aligned(cells, numeric, widths, borders, out)
+        del sample
+        for rows in batches:
+            if rows:
+                cells, numeric = self._format_batch(rows)
+                row_count += self._write_aligned(cells, numeric, widths, borders, out)
+        if borders:
+            out.write(separator + "\n")
+            out.flush()
+        return row_count
+
+    @staticmethod
+    def _write_aligned(cells: list, numeric: list, widths: list, borders: bool, out) -> int:
+        for index, (column_cells, width, is_numeric) in enumerate(zip(cells, widths, numeric)):
+            # Do rong da chot: chuoi dai hon bi cat de bang khong bi lech. So khong bao gio
+            # bi cat (cat chu so la in sai gia tri), so rong hon chi day lech dong cua no
+            if not is_numeric and max(map(len, column_cells)) > width:
+                cells[index] = _truncate(column_cells, width)
+        # Can le ca cot mot lan (map chay o tang C), roi ghep dong tu cac cot
+        padded = [
+            list(map(str.rjust if is_numeric else str.ljust, column_cells, repeat(width)))
+            for column_cells, width, is_numeric in zip(cells, widths, numeric)
+        ]
+        if borders:
+            padded[0] = list(map("| ".__add__, padded[0]))
+            padded[-1] = list(map(str.__add__, padded[-1], repeat(" |")))
+        elif not numeric[-1]:
+            padded[-1] = cells[-1]
+        out.write("\n".join(map(" | ".join, zip(*padded))) + "\n")
+        out.flush()
+        return len(cells[0])
+
+    def _render_vertical(self, columns: list, batches, out) -> int:
+        label_width = max(map(len, columns), default=0)
+        labels = [name.rjust(label_width) + ": " for name in columns]
+        row_count = 0
+        for rows in batches:
+            if not rows:
+                continue
+            cells, _ = self._format_batch(rows)
+            blocks = []
+            for offset, row_cells in enumerate(zip(*cells), start=row_count + 1):
+                blocks.append(f"{'*' * 27} {offset}. row {'*' * 27}")
+                blocks.append("\n".join(map(str.__add__, labels, row_cells)))
+            out.write("\n".join(blocks) + "\n")
+            out.flush()
+            row_count += len(rows)
+        return row_count
+
+    def _render_stats(self, columns: list, batches, out) -> int:
+        stats = [_ColumnStats(name) for name in columns]
+        row_count = 0
+        for rows in batches:
+            if not rows:
+                continue
+            for column_stats, column in zip(stats, zip(*rows)):
+                column_stats.update(column)
+            row_count += len(rows)
+        summary = ResultRenderer("table", max_width=0, null="")
+        summary.render(
+            ["column", "type", "count", "nulls", "min", "max", "mean", "max_len"],
+            [[column_stats.row() for column_stats in stats]],
+            out
+        )
+        out.write(f"({row_count} dòng đã đọc)\n")
+        return row_count
+
@@ -0,0 +1,62 @@
+import logging
+import shlex
+import subprocess
+import sys
+from contextlib import contextmanager
+from metrics import ROWS_FETCHED, RESULT_BYTES, estimate_row_bytes
+
+
+def iter_batches(cursor, batch_size: int, max_rows: int = 0):
+    """
+    Đọc kết quả theo từng lô bằng fetchmany thay vì fetchall, nên bộ nhớ
+    chỉ giữ tối đa `batch_size` dòng. Dừng sau `max_rows` dòng nếu > 0.
+    """
+    fetched = 0
+    while True:
+        size = batch_size
+        if max_rows:
+            size = min(batch_size, max_rows - fetched)
+            if size <= 0:
+                return
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        fetched += len(rows)
+        ROWS_FETCHED.inc(len(rows))
+        RESULT_BYTES.inc(estimate_row_bytes(rows[0]) * len(rows))
+        yield rows
+
+
+def write_rows(columns: list, batches, out) -> int:
+    """Ghi header khi lô đầu tiên tới rồi ghi từng lô ngay khi nhận được."""
+    row_count = 0
+    for rows in batches:
+        if row_count == 0:
+            header = " | ".join(columns)
+            out.write(header + "\n" + "-" * len(header) + "\n")
+        out.write("".join(" | ".join(map(str, row)) + "\n" for row in rows))
+        out.flush()
+        row_count += len(rows)
+    return row_count
+
+
+@contextmanager
+def open_output(pager: str | None = None):
+    """Trả về stdout, hoặc stdin của tiến trình pager (vd. 'less -S') nếu có cấu hình."""
+    if not pager:
+        yield sys.stdout
+        return
+    try:
+        proc = subprocess.Popen(shlex.split(pager), stdin=subprocess.PIPE, text=True)
+    except OSError as e:
+        logging.warning(f"Khong mo duoc pager '{pager}', in ra man hinh: {e}")
+        yield sys.stdout
+        return
+    try:
+        yield proc.stdin
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait()
@@ -1,9 +1,144 @@
 import logging
 import time
+from config import SQL_FETCH_BATCH_SIZE, SQL_MAX_ROWS, SQL_PAGER, SQL_OUTPUT_FORMAT, RESULT_CACHE_TTL_SECONDS
 from db_manager import DatabaseManager
 from mysql.connector import Error
+from result_stream import iter_batches, open_output
+from result_renderer import ResultRenderer, RENDER_FORMATS
+from bulk_loader import BulkLoader
+from result_export import export_query
+from query_cache import is_cacheable
+from metrics import REGISTRY
+
+# Dung luong cache mac dinh khi bat bang \cache on ma chua cau hinh RESULT_CACHE_MAX_BYTES
+INTERACTIVE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def handle_meta_command(command: str, settings: dict, db_manager: DatabaseManager):
+    """Xử lý các lệnh bắt đầu bằng '\\' (vd. \\limit 100, \\pager less -S)."""
+    name, _, arg = command[1:].partition(" ")
+    name = name.lower()
+    arg = arg.strip()
+    if name == "limit":
+        if not arg:
+            print(f"Giới hạn dòng hiện tại: {settings['max_rows'] or 'không giới hạn'}")
+        elif arg.lower() == "off" or arg == "0":
+            settings['max_rows'] = 0
+            print("Đã tắt giới hạn dòng.")
+        elif arg.isdigit():
+            settings['max_rows'] = int(arg)
+            print(f"Chỉ hiển thị tối đa {arg} dòng mỗi lệnh.")
+        else:
+            print("Cú pháp: \\limit <số dòng>|off")
+    elif name == "pager":
+        if not arg or arg.lower() == "off":
+            settings['pager'] = None
+            print("Đã tắt pager, kết quả in trực tiếp ra màn hình.")
+        else:
+            settings['pager'] = arg
+            print(f"Kết quả sẽ được đưa qua pager: {arg}")
+    elif name == "load":
+        parts = arg.split()
+        if len(parts) != 2:
+            print("Cú pháp: \\load <file.csv|file.tsv> <bảng>")
+            return
+        stats = BulkLoader(db_manager).load(parts[0], parts[1])
+        if stats:
+            print(f"Đã nạp {stats['rows']} dòng trong {stats['elapsed']:.2f} giây ({stats['rows_per_second']:.0f} dòng/giây).")
+        else:
+            print("Nạp dữ liệu thất bại. Kiểm tra log để biết chi tiết.")
+    elif name == "export":
+        path, _, query = arg.partition(" ")
+        if not path or not query.strip():
+            print("Cú pháp: \\export <file.csv|file.jsonl[.gz]> <câu SELECT>")
+            return
+        stats = export_query(db_manager, query.strip().rstrip(";"), path)
+        if stats:
+            print(f"Đã xuất {stats['rows']} dòng ra {path} trong {stats['elapsed']:.2f} giây.")
+        else:
+            print("Xuất dữ liệu thất bại. Kiểm tra log để biết chi tiết.")
+    elif name == "cache":
+        arg = arg.lower()
+        if arg == "on":
+            if db_manager.result_cache is None:
+                db_manager.enable_result_cache(INTERACTIVE_CACHE_BYTES, RESULT_CACHE_TTL_SECONDS)
+            settings['cache'] = True
+            print("Đã bật cache kết quả cho các câu SELECT.")
+        elif arg == "off":
+            settings['cache'] = False
+            print("Đã tắt cache kết quả.")
+        elif arg == "clear":
+            if db_manager.result_cache:
+                db_manager.result_cache.clear()
+            print("Đã xóa cache kết quả.")
+        elif db_manager.result_cache:
+            stats = db_manager.result_cache.stats()
+            print(f"Cache: {'bật' if settings['cache'] else 'tắt'}, {stats['entries']} kết quả, "
+                  f"{stats['bytes']}/{stats['max_bytes']} byte, hit {stats['hits']}, miss {stats['misses']}")
+        else:
+            print("Cache kết quả chưa bật. Dùng \\cache on.")
+    elif name == "format":
+        arg = arg.lower()
+        if not arg:
+            print(f"Định dạng hiện tại: {settings['format']}")
+        elif arg in RENDER_FORMATS:
+            settings['format'] = arg
+            print(f"Kết quả sẽ hiển thị dạng: {arg}")
+        else:
+            print(f"Cú pháp: \\format <{'|'.join(RENDER_FORMATS)}>")
+    elif name == "metrics":
+        print(REGISTRY.to_json() if arg.lower() == "json" else REGISTRY.to_prometheus())
+    else:
+        print(f"Lệnh không hỗ trợ: \\{name}. Các lệnh hỗ trợ: \\limit, \\pager, \\load, \\export, \\cache, \\format, \\metrics")
+
+
+def print_result_set(db_manager: DatabaseManager, cursor, settings: dict, fmt: str | None = None) -> int:
+    """
+    Stream kết quả ra màn hình/pager theo lô, trả về số dòng đã hiển thị.
+    `fmt` ghi đè định dạng của phiên cho riêng lệnh này (vd. \\G).
+    """
+    columns = [col[0] for col in cursor.description]
+    max_rows = settings['max_rows']
+    row_count = 0
+    try:
+        with open_output(settings['pager']) as out:
+            renderer = ResultRenderer(fmt or settings['format'])
+            row_count = renderer.render(columns, iter_batches(cursor, SQL_FETCH_BATCH_SIZE, max_rows), out)
+    except BrokenPipeError:
+        # Người dùng đóng pager trước khi đọc hết kết quả
+        logging.info("Pager đã đóng, bỏ qua phần kết quả còn lại.")
+    # Chạm giới hạn dòng hoặc pager đã đóng: dừng câu lệnh (KILL QUERY) thay vì kéo hết phần còn lại về
+    db_manager.cancel_unread_result()
+    if max_rows and row_count >= max_rows:
+        print(f"(Đã dừng ở giới hạn {max_rows} dòng, dùng \\limit off để xem toàn bộ)")
+    return row_count
+
+
+def print_cached_result(db_manager: DatabaseManager, sql_command: str, settings: dict, fmt: str | None = None):
+    """Chạy câu SELECT qua cache kết quả rồi in ra dạng stream như print_result_set."""
+    start_time = time.perf_counter()
+    max_rows = settings['max_rows']
+    result = db_manager.stream_cached(sql_command, max_rows=max_rows)
+    if result is None:
+        print("Lỗi khi thực thi lệnh trên database. Kiểm tra log để biết chi tiết.")
+        return
+    logging.info(f"Lệnh thực thi trong: {time.perf_counter() - start_time:.4f} giây")
+    columns, batches = result
+    row_count = 0
+    try:
+        with open_output(settings['pager']) as out:
+            row_count = ResultRenderer(fmt or settings['format']).render(columns, batches, out)
+    except BrokenPipeError:
+        logging.info("Pager đã đóng, bỏ qua phần kết quả còn lại.")
+    finally:
+        # Dong generator: bo phan ket qua chua doc va dong cursor
+        if hasattr(batches, "close"):
+            batches.close()
+    if row_count == 0:
+        print(f"Thành công: Lệnh trả về 0 dòng.")
+    elif max_rows and row_count >= max_rows:
+        print(f"(Đã dừng ở giới hạn {max_rows} dòng, dùng \\limit off để xem toàn bộ)")
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def start_interactive_session(db_manager: DatabaseManager):
     """Bắt đầu một phiên SQL tương tác với người dùng."""
@@ -11,10 +146,13 @@ def start_interactive_session(db_manager: DatabaseManager):
         logging.error("Không thể bắt đầu phiên: Chưa kết nối database.")
         return
 
+    settings = {'max_rows': SQL_MAX_ROWS, 'pager': SQL_PAGER, 'cache': db_manager.result_cache is not None,
+                'format': SQL_OUTPUT_FORMAT if SQL_OUTPUT_FORMAT in RENDER_FORMATS else "table"}
     print("\nĐã kết nối đến database. Nhập lệnh SQL hoặc 'exit'/'quit' để thoát.")
     while True:
-        if not db_manager.is_connected():
-            print("\nMất kết nối đến database. Phiên kết thúc.")
+        # Rẻ khi kết nối vừa hoạt động; nếu kết nối đã mất thì thử kết nối lại trước khi bỏ cuộc
+        if not db_manager.ensure_connected():
+            print("\nMất kết nối đến database và không kết nối lại được. Phiên kết thúc.")
             break
 
         try:
@@ -25,23 +163,29 @@ def start_interactive_session(db_manager: DatabaseManager):
             if sql_command.lower() in ['quit', 'exit']:
                 print("Đang thoát phiên tương tác...")
                 break
-            start_time = time.time()
+            fmt = None
+            if sql_command.endswith("\\G"):
+                # Nhu client mysql: ket thuc bang \G thi hien thi dang doc cho rieng lenh nay
+                sql_command = sql_command[:-2].rstrip().rstrip(";")
+                fmt = "vertical"
+                if not sql_command:
+                    continue
+            elif sql_command.startswith("\\"):
+                handle_meta_command(sql_command, settings, db_manager)
+                continue
+            if settings['cache'] and is_cacheable(sql_command):
+                print_cached_result(db_manager, sql_command, settings, fmt)
+                continue
+            start_time = time.perf_counter()
             cursor = db_manager.execute_sql(sql_command) 
-            end_time = time.time()
+            end_time = time.perf_counter()
 
             if cursor:
                 logging.info(f"Lệnh thực thi trong: {end_time - start_time:.4f} giây")
                 is_dml = False 
                 try:
                     if cursor.description:
-                        columns = [col[0] for col in cursor.description]
-                        rows = cursor.fetchall()
-                        if rows:
-                            print(" | ".join(columns))
-                            print("-" * (len(" | ".join(columns))))
-                            for row in rows:
-                                print(" | ".join(map(str, row)))
-                        else:
+                        if print_result_set(db_manager, cursor, settings, fmt) == 0:
                             print(f"Thành công: Lệnh trả về 0 dòng.")
                     else:
                         is_dml = True
@@ -50,11 +194,13 @@ def start_interactive_session(db_manager: DatabaseManager):
                         print("Đã commit thay đổi.")
 
                 except Error as e:
+                    db_manager.note_error(e)
                     logging.error(f"Lỗi khi xử lý kết quả: {e}")
                     print("Đang rollback do lỗi xử lý kết quả...")
                     db_manager.rollback()
                 finally:
                     if cursor:
+                        db_manager.discard_unread_result()
                         try:
                             cursor.close()
                         except Error as ce:
@@ -0,0 +1,77 @@
+import importlib
+import importlib.util
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def lazy_import(name: str):
+    """
+    Trả về module `name` nhưng chỉ thực thi nó ở lần truy cập thuộc tính
+    đầu tiên (importlib.util.LazyLoader), để import các thư viện nặng như
+    hvac không nằm trên đường khởi động nếu chưa dùng tới.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class StartupReport:
+    """Đo thời gian từng giai đoạn khởi động, in ra dạng bảng như -X importtime."""
+
+    def __init__(self, started_at: float | None = None):
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self._lock = threading.Lock()
+        # (ten giai doan, bat dau tu luc khoi dong, thoi gian, luong)
+        self.phases = []
+
+    def record(self, name: str, start: float, end: float):
+        with self._lock:
+            self.phases.append((name, start - self.started_at, end - start, threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def preload(self, *names: str) -> threading.Thread:
+        """
+        Import các module ở luồng nền (vd. mysql.connector trong lúc chờ
+        Vault cấp credentials). Lần import sau ở luồng chính chờ trên import
+        lock của module nên không bị import hai lần.
+        """
+        def _load():
+            for name in names:
+                try:
+                    with self.phase(f"import {name}"):
+                        importlib.import_module(name)
+                except ImportError as e:
+                    logging.debug(f"Preload {name} that bai: {e}")
+
+        thread = threading.Thread(target=_load, name="Preload", daemon=True)
+        thread.start()
+        return thread
+
+    def render(self) -> str:
+        total = time.perf_counter() - self.started_at
+        lines = [f"{'bắt đầu (ms)':>13} | {'thời gian (ms)':>14} | {'luồng':<10} | giai đoạn"]
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        for name, offset, elapsed, thread_name in phases:
+            lines.append(f"{offset * 1000:13.1f} | {elapsed * 1000:14.1f} | {thread_name[:10]:<10} | {name}")
+        lines.append(f"{'':13} | {total * 1000:14.1f} | {'':10} | tổng tới khi sẵn sàng")
+        return "\n".join(lines)
@@ -0,0 +1,78 @@
+import unittest
+
+from batch_runner import BatchRunner, split_sql_statements
+
+
+def split(script: str) -> list:
+    return list(split_sql_statements(script.splitlines(keepends=True)))
+
+
+class SplitSqlStatementsTest(unittest.TestCase):
+
+    def test_splits_on_delimiter(self):
+        self.assertEqual(
+            split("SELECT 1;\nSELECT 2; SELECT 3;\n"),
+            [("SELECT 1", False), ("SELECT 2", False), ("SELECT 3", False)],
+        )
+
+    def test_last_statement_without_delimiter(self):
+        self.assertEqual(split("SELECT 1;\nSELECT 2\n"), [("SELECT 1", False), ("SELECT 2", False)])
+
+    def test_statement_spanning_lines(self):
+        self.assertEqual(split("SELECT\n  1\n;\n"), [("SELECT\n  1", False)])
+
+    def test_delimiter_inside_quotes_and_identifiers(self):
+        self.assertEqual(
+            split("SELECT ';', \"a;b\", `c;d` FROM t;\nSELECT 'it''s;', 'x\\';y';\n"),
+            [("SELECT ';', \"a;b\", `c;d` FROM t", False), ("SELECT 'it''s;', 'x\\';y'", False)],
+        )
+
+    def test_quote_spanning_lines(self):
+        self.assertEqual(split("INSERT INTO t VALUES ('a;\nb');\n"), [("INSERT INTO t VALUES ('a;\nb')", False)])
+
+    def test_trailing_line_comments_are_kept(self):
+        self.assertEqual(
+            split("SELECT 1 -- mot; hai\n;\nSELECT 2 # ba;\n"),
+            [("SELECT 1 -- mot; hai", False), ("SELECT 2 # ba;", False)],
+        )
+
+    def test_double_dash_needs_whitespace(self):
+        self.assertEqual(split("SELECT 1--2;\n"), [("SELECT 1--2", False)])
+
+    def test_block_comment(self):
+        self.assertEqual(
+            split("SELECT /* ; */ 1;\n/* dong 1;\ndong 2; */ SELECT 2;\n"),
+            [("SELECT /* ; */ 1", False), ("/* dong 1;\ndong 2; */ SELECT 2", False)],
+        )
+
+    def test_comment_only_script_yields_nothing(self):
+        self.assertEqual(split("-- chi co comment\n# va comment\n/* ; */\n"), [])
+
+    def test_custom_delimiter(self):
+        script = (
+            "DELIMITER //\n"
+            "CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END//\n"
+            "DELIMITER ;\n"
+            "CALL p();\n"
+        )
+        self.assertEqual(
+            split(script),
+            [("CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END", True), ("CALL p()", False)],
+        )
+
+
+class FlushTest(unittest.TestCase):
+
+    def test_delimiter_not_swallowed_by_trailing_comment(self):
+        runner = BatchRunner(db_manager=None)
+        scripts = []
+        runner._execute = lambda sql_script: scripts.append(sql_script) or True
+
+        statements = [statement for statement, _ in split("SELECT 1 -- ghi chu\n;\nSELECT 2 # het\n")]
+        self.assertTrue(runner._flush(statements))
+        # Delimiter nam tren dong rieng, khong bi comment cuoi lenh truoc nuot mat
+        self.assertEqual(scripts, ["SELECT 1 -- ghi chu\n;\nSELECT 2 # het"])
+
+
+if __name__ == "__main__":
+    unittest.main()
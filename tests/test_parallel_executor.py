@@ -0,0 +1,132 @@
+import unittest
+from contextlib import contextmanager
+
+try:
+    from mysql.connector import Error
+    from db_manager import DatabaseManager
+    from parallel_executor import ParallelQueryExecutor, QueryTask
+except ImportError:
+    ParallelQueryExecutor = None
+
+_ER_QUERY_INTERRUPTED = 1317
+
+
+class FakeConnection:
+    """Kết nối không buffer: các dòng chưa đọc còn nằm trên kết nối tới khi consume hoặc bị KILL."""
+
+    def __init__(self, connection_id: int):
+        self.connection_id = connection_id
+        self.pending = []
+        self.killed = False
+        self.consumed = 0
+
+    @property
+    def unread_result(self) -> bool:
+        return bool(self.pending)
+
+    def consume_results(self):
+        if self.killed:
+            # Server chi con gui not phan dong dang tren duong truyen roi bao 1317
+            self.consumed += min(len(self.pending), 2)
+            self.pending = []
+            raise Error(msg="Query execution was interrupted", errno=_ER_QUERY_INTERRUPTED)
+        self.consumed += len(self.pending)
+        self.pending = []
+
+
+class FakeCursor:
+
+    def __init__(self, connection: FakeConnection, rows: list):
+        self.connection = connection
+        self.rows = rows
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, sql: str):
+        self.description = [("id",)]
+        self.connection.pending = list(self.rows)
+
+    def fetchmany(self, size: int) -> list:
+        rows, self.connection.pending = self.connection.pending[:size], self.connection.pending[size:]
+        self.rowcount = len(rows)
+        return rows
+
+    def fetchall(self) -> list:
+        return self.fetchmany(len(self.connection.pending))
+
+    def close(self):
+        if self.connection.unread_result:
+            raise Error(msg="Unread result found")
+
+
+class FakePooled:
+
+    def __init__(self, connection: FakeConnection, rows: list):
+        self.connection = connection
+        self.rows = rows
+        self.broken = False
+
+    def cursor(self):
+        return FakeCursor(self.connection, self.rows)
+
+
+class FakeDatabaseManager:
+    cancel_pooled_result = DatabaseManager.cancel_pooled_result if ParallelQueryExecutor else None
+
+    def __init__(self, rows: list):
+        self.pool = type("Pool", (), {"pool_size": 2})()
+        self.pooled = FakePooled(FakeConnection(42), rows)
+        self.discarded = []
+        self.killed = []
+
+    @contextmanager
+    def pooled_connection(self):
+        discard = False
+        try:
+            yield self.pooled
+        except Error:
+            discard = True
+            raise
+        finally:
+            self.discarded.append(discard or self.pooled.broken)
+
+    def kill_query(self, connection_id: int) -> bool:
+        self.killed.append(connection_id)
+        self.pooled.connection.killed = True
+        return True
+
+
+@unittest.skipUnless(ParallelQueryExecutor, "can mysql-connector-python va cac phu thuoc cua db_manager")
+class RunTaskMaxRowsTest(unittest.TestCase):
+
+    def test_max_rows_smaller_than_result_kills_rest(self):
+        db_manager = FakeDatabaseManager([(i,) for i in range(1000)])
+        executor = ParallelQueryExecutor(db_manager, timeout=0)
+        try:
+            result = executor._run_task(QueryTask("SELECT id FROM t", max_rows=10))
+        finally:
+            executor.shutdown()
+
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(result.rows, [(i,) for i in range(10)])
+        self.assertEqual(db_manager.killed, [42])
+        # Chi doc bo phan dong dang tren duong truyen, khong keo ca 990 dong con lai
+        self.assertLess(db_manager.pooled.connection.consumed, 990)
+        self.assertEqual(db_manager.discarded, [False])
+
+    def test_result_read_fully_sends_no_kill(self):
+        db_manager = FakeDatabaseManager([(i,) for i in range(5)])
+        executor = ParallelQueryExecutor(db_manager, timeout=0)
+        try:
+            result = executor._run_task(QueryTask("SELECT id FROM t", max_rows=10))
+        finally:
+            executor.shutdown()
+
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(len(result.rows), 5)
+        self.assertEqual(db_manager.killed, [])
+        self.assertEqual(db_manager.discarded, [False])
+
+
+if __name__ == "__main__":
+    unittest.main()
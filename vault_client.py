@@ -1,11 +1,16 @@
 # vault_client.py
-import hvac
 import logging
+import time
 from config import VAULT_ADDR # Giả sử các config này đúng
 from config import VAULT_TOKEN, VAULT_DB_ROLE
-from hvac.exceptions import VaultError # Import thêm
+from metrics import VAULT_LATENCY, VAULT_ERRORS
+from lease_scheduler import LeaseScheduler, LeaseHandle
+from credential_broker import CredentialBroker
+from startup import lazy_import
+
+# hvac chỉ thực sự được import khi tạo client (xem startup.lazy_import)
+hvac = lazy_import("hvac")
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class VaultClient:
 
@@ -13,6 +18,9 @@ class VaultClient:
         self.vault_addr = vault_addr
         self.vault_token = vault_token
         self.client = None
+        self._authenticated = False
+        self.lease_scheduler = None
+        self.credential_broker = None
         try:
             self._connect()
         except ConnectionError:
@@ -30,6 +38,8 @@ class VaultClient:
             self.client = hvac.Client(url=self.vault_addr, token=self.vault_token)
             # Kiểm tra xác thực ngay lập tức
             if self.client.is_authenticated():
+                # Ghi nhớ kết quả, các lần kiểm tra sau không gọi lại Vault
+                self._authenticated = True
                 logging.info(f"Ket noi va xac thuc Vault thanh cong.")
             else:
                 # Token có thể đúng cú pháp nhưng không hợp lệ
@@ -38,7 +48,7 @@ class VaultClient:
                 self.client = None
                 raise ConnectionError("Token Vault không hợp lệ hoặc không có quyền.")
 
-        except VaultError as ve:
+        except hvac.exceptions.VaultError as ve:
              logging.error(f"Loi Vault khi ket noi/xac thuc tai {self.vault_addr}: {ve}")
              self.client = None # Đảm bảo client là None khi có lỗi
              raise ConnectionError(f"Loi Vault khi ket noi: {ve}")
@@ -53,9 +63,9 @@ class VaultClient:
         """
         Kiểm tra xem client Vault đã được kết nối và xác thực thành công chưa.
         """
-        # Chỉ cần kiểm tra self.client có tồn tại và đã xác thực thành công hay không
-        # vì _connect đã xử lý việc đặt self.client=None nếu xác thực thất bại.
-        return self.client is not None and self.client.is_authenticated()
+        # Dùng kết quả xác thực đã lưu từ _connect thay vì gọi lookup-self mỗi lần;
+        # lỗi 401/403 từ các lệnh gọi sau sẽ xóa cờ này.
+        return self.client is not None and self._authenticated
     # =================================
 
     def get_db_credentials(self, role_name: str) -> dict | None:
@@ -67,7 +77,9 @@ class VaultClient:
         logging.info(f"Dang yeu cau credentials cho role: {role_name}")
         try:
             # Sử dụng generate_credentials là đúng cho database secrets engine
+            start_time = time.perf_counter()
             read_response = self.client.secrets.database.generate_credentials(name=role_name)
+            VAULT_LATENCY.observe(time.perf_counter() - start_time, operation="get_db_credentials")
 
             # Kiểm tra cấu trúc response trước khi truy cập
             if 'data' not in read_response or not read_response['data']:
@@ -91,16 +103,41 @@ class VaultClient:
                 "username": creds['username'],
                 "password": creds['password'],
                 "lease_id": lease_id,
-                "lease_duration": lease_duration
+                "lease_duration": lease_duration,
+                "renewable": read_response.get('renewable', False)
             }
-        except VaultError as ve:
+        except hvac.exceptions.VaultError as ve:
+             VAULT_ERRORS.inc(operation="get_db_credentials")
+             self._check_auth_error(ve)
              logging.error(f"Loi Vault khi lay credentials cho role '{role_name}': {ve}")
              return None
         except Exception as e:
             # Bắt lỗi chung cuối cùng
+            VAULT_ERRORS.inc(operation="get_db_credentials")
             logging.error(f"Loi khong mong doi khi lay credentials cho role '{role_name}': {e}", exc_info=True)
             return None
 
+    def _check_auth_error(self, error: Exception):
+        if isinstance(error, (hvac.exceptions.Unauthorized, hvac.exceptions.Forbidden)):
+            logging.error("Token Vault khong con hop le (401/403).")
+            self._authenticated = False
+
+    def enable_credential_broker(self, role_name: str, spares_per_role: int | None = None) -> CredentialBroker:
+        """Bật giữ sẵn credentials dự phòng cho `role_name` (xem CredentialBroker)."""
+        if self.credential_broker is None:
+            if spares_per_role is None:
+                self.credential_broker = CredentialBroker(self)
+            else:
+                self.credential_broker = CredentialBroker(self, spares_per_role=spares_per_role)
+        self.credential_broker.warm(role_name)
+        return self.credential_broker
+
+    def acquire_db_credentials(self, role_name: str) -> dict | None:
+        """Như get_db_credentials nhưng dùng spare của broker nếu đã bật."""
+        if self.credential_broker is not None:
+            return self.credential_broker.acquire(role_name)
+        return self.get_db_credentials(role_name)
+
     def revoke_lease(self, lease_id: str):
         # Không cần kiểm tra is_authenticated() ở đây nữa nếu muốn thử revoke ngay cả khi client có vấn đề
         # Tuy nhiên, kiểm tra self.client là cần thiết
@@ -113,10 +150,54 @@ class VaultClient:
 
         logging.info(f"Dang gui yeu cau revoke cho lease: {lease_id[:8]}...")
         try:
+            start_time = time.perf_counter()
             self.client.sys.revoke_lease(lease_id)
+            VAULT_LATENCY.observe(time.perf_counter() - start_time, operation="revoke_lease")
             logging.info(f"-> Yeu cau revoke cho lease {lease_id[:8]}... da duoc gui.")
-        except VaultError as ve:
+        except hvac.exceptions.VaultError as ve:
              # Lỗi thường gặp: lease không tồn tại, đã revoke, không có quyền
+             VAULT_ERRORS.inc(operation="revoke_lease")
              logging.warning(f"Loi Vault khi revoke lease {lease_id[:8]}... (co the da het han/bi revoke): {ve}")
         except Exception as e:
-            logging.error(f"Loi khong mong doi khi revoke lease {lease_id[:8]}...: {e}")
\ No newline at end of file
+            VAULT_ERRORS.inc(operation="revoke_lease")
+            logging.error(f"Loi khong mong doi khi revoke lease {lease_id[:8]}...: {e}")
+
+    def renew_lease(self, lease_id: str, increment: int | None = None) -> dict | None:
+        if not self.client:
+             logging.warning("Khong co client Vault hop le de renew lease.")
+             return None
+        if not lease_id:
+            logging.warning("Khong co lease ID duoc cung cap de renew.")
+            return None
+
+        logging.debug(f"Dang gui yeu cau renew cho lease: {lease_id[:8]}... (increment: {increment})")
+        try:
+            start_time = time.perf_counter()
+            response = self.client.sys.renew_lease(lease_id=lease_id, increment=increment)
+            VAULT_LATENCY.observe(time.perf_counter() - start_time, operation="renew_lease")
+            if not response or 'lease_duration' not in response:
+                 logging.error(f"Response renew tu Vault thieu lease_duration cho lease {lease_id[:8]}...")
+                 return None
+            logging.info(f"-> Renew lease {lease_id[:8]}... thanh cong, Duration: {response['lease_duration']}s")
+            return {
+                "lease_id": response.get('lease_id') or lease_id,
+                "lease_duration": response['lease_duration'],
+                "renewable": response.get('renewable', False)
+            }
+        except hvac.exceptions.VaultError as ve:
+             VAULT_ERRORS.inc(operation="renew_lease")
+             logging.warning(f"Loi Vault khi renew lease {lease_id[:8]}...: {ve}")
+             return None
+        except Exception as e:
+            VAULT_ERRORS.inc(operation="renew_lease")
+            logging.error(f"Loi khong mong doi khi renew lease {lease_id[:8]}...: {e}")
+            return None
+
+    def start_lease_renewal(self, role_name: str, creds: dict, on_rotate) -> LeaseHandle:
+        """
+        Đưa lease của `creds` vào LeaseScheduler dùng chung của client (tạo ở
+        lần gọi đầu). Xem LeaseScheduler.schedule về `on_rotate`.
+        """
+        if self.lease_scheduler is None:
+            self.lease_scheduler = LeaseScheduler(self)
+        return self.lease_scheduler.schedule(role_name, creds, on_rotate)